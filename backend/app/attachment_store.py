@@ -2,26 +2,100 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from datetime import datetime
-from typing import Any
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from typing import IO, Any, TypeVar
 from uuid import uuid4
 
 from chatkit.store import AttachmentStore
 from chatkit.types import Attachment, AttachmentCreateParams, FileAttachment, ImageAttachment
-from openai import AsyncOpenAI
+from openai import (
+    APIConnectionError,
+    APIError,
+    AsyncOpenAI,
+    InternalServerError,
+    NotFoundError,
+    RateLimitError,
+)
+from openai.types import FileObject
 
 from .config import settings
-from .database import get_db_pool
+from .database import ConnectionLease, acquire_connection, get_db_pool
+from .thread_item_converter import forget_openai_file_id
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Errors worth retrying: network failures and timeouts (APITimeoutError is an
+# APIConnectionError), rate limiting and 5xx responses. Other 4xx errors are permanent.
+_TRANSIENT_OPENAI_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+_OPENAI_ATTEMPTS = 3
+_OPENAI_RETRY_BASE_DELAY_SECONDS = 1.0
+
+
+async def _retry_transient(operation: Callable[[], Awaitable[T]]) -> T:
+    """Run ``operation``, retrying transient OpenAI errors with exponential backoff."""
+    for attempt in range(_OPENAI_ATTEMPTS - 1):
+        try:
+            return await operation()
+        except _TRANSIENT_OPENAI_ERRORS as e:
+            delay = _OPENAI_RETRY_BASE_DELAY_SECONDS * 2**attempt
+            logger.warning(f"Transient OpenAI error, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+    return await operation()
+
+
+_SELECT_UPLOAD_FILE_ID = """
+    SELECT openai_file_id FROM public.uploads
+    WHERE id = $1 AND user_id = $2
+"""
+
+_DELETE_UPLOAD = "DELETE FROM public.uploads WHERE id = $1 AND user_id = $2"
+
+_SELECT_UPLOAD = """
+    SELECT id, filename, byte_size, mime, openai_file_id, created_at
+    FROM public.uploads
+    WHERE id = $1 AND user_id = $2
+"""
+
+_UPSERT_UPLOADING_FILE = """
+    INSERT INTO public.uploads
+    (id, user_id, filename, byte_size, mime, status)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    ON CONFLICT (id) DO UPDATE
+    SET status = EXCLUDED.status, updated_at = now()
+    WHERE public.uploads.user_id = EXCLUDED.user_id AND public.uploads.status <> 'uploaded'
+    RETURNING id
+"""
+
+_SELECT_UPLOAD_STATUS = """
+    SELECT id, status, openai_file_id FROM public.uploads
+    WHERE id = $1 AND user_id = $2
+"""
+
+_UPSERT_UPLOADED_FILE = """
+    INSERT INTO public.uploads
+    (id, user_id, openai_file_id, filename, byte_size, mime, status)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    ON CONFLICT (id) DO UPDATE
+    SET openai_file_id = EXCLUDED.openai_file_id,
+        status = EXCLUDED.status,
+        updated_at = now()
+    WHERE public.uploads.user_id = EXCLUDED.user_id
+"""
+
 
 class SupabaseAttachmentStore(AttachmentStore[dict[str, Any]]):
     """Store attachments in Supabase and upload files to OpenAI Files API."""
 
     def __init__(self, openai_client: AsyncOpenAI):
         self.openai_client = openai_client
+        # Retries are handled by _retry_transient, so the SDK's own retries are disabled
+        # for the calls it wraps.
+        self._openai_no_retry = openai_client.with_options(max_retries=0)
 
     @staticmethod
     def _get_user_id(context: dict[str, Any]) -> int:
@@ -37,17 +111,26 @@ class SupabaseAttachmentStore(AttachmentStore[dict[str, Any]]):
         return int(user_id)
 
     def generate_attachment_id(self, mime_type: str, context: dict[str, Any]) -> str:
-        """Generate a unique attachment ID."""
-        return f"att_{uuid4().hex[:16]}"
+        """Generate a unique attachment ID.
+
+        A full UUID, matching the ``gen_random_uuid()`` default used for uploads rows
+        inserted without an ID. The ID has to exist before anything is written: the
+        row is only created once the file arrives (see ``begin_upload``).
+        """
+        return str(uuid4())
 
     async def create_attachment(
         self, input: AttachmentCreateParams, context: dict[str, Any]
     ) -> Attachment:
-        """Create an attachment record and return upload URL for two-phase upload."""
+        """Return an attachment with its upload URL for two-phase upload.
+
+        Nothing is written to the database yet: the uploads row is created in a single
+        upsert once the file reaches OpenAI (see ``upload_file_to_openai``).
+        """
         user_id = self._get_user_id(context)
         attachment_id = self.generate_attachment_id(input.mime_type, context)
 
-        now = datetime.now()
+        now = datetime.now(UTC)
 
         # Create the attachment object based on type
         if input.mime_type.startswith("image/"):
@@ -74,24 +157,6 @@ class SupabaseAttachmentStore(AttachmentStore[dict[str, Any]]):
                 upload_url=f"/api/attachments/{attachment_id}/upload",
             )
 
-        # Store attachment metadata in database
-        pool = await get_db_pool()
-        async with pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO public.uploads (id, user_id, filename, byte_size, mime, status, created_at, updated_at)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                """,
-                attachment_id,
-                user_id,
-                input.name or "untitled",
-                input.size_bytes or 0,
-                input.mime_type,
-                "pending",  # Status before upload completes
-                now,
-                now,
-            )
-
         logger.info(f"Created attachment {attachment_id} for user {user_id}")
         return attachment
 
@@ -102,51 +167,45 @@ class SupabaseAttachmentStore(AttachmentStore[dict[str, Any]]):
 
         async with pool.acquire() as conn:
             # Get the OpenAI file ID if it exists
-            row = await conn.fetchrow(
-                """
-                SELECT openai_file_id FROM public.uploads
-                WHERE id = $1 AND user_id = $2
-                """,
-                attachment_id,
-                user_id,
-            )
+            row = await conn.fetchrow(_SELECT_UPLOAD_FILE_ID, attachment_id, user_id)
+
+        if not row:
+            logger.warning(f"Attachment {attachment_id} not found for user {user_id}")
+            return
+
+        # Delete from OpenAI if file was uploaded. No connection is held meanwhile: the
+        # retried call and its backoff can take seconds.
+        openai_file_id = row["openai_file_id"]
+        if openai_file_id:
+            try:
+                await _retry_transient(lambda: self._openai_no_retry.files.delete(openai_file_id))
+                logger.info(f"Deleted OpenAI file {openai_file_id}")
+            except NotFoundError:
+                logger.info(f"OpenAI file {openai_file_id} was already deleted")
+            except _TRANSIENT_OPENAI_ERRORS as e:
+                logger.error(
+                    f"Giving up deleting OpenAI file {openai_file_id} after "
+                    f"{_OPENAI_ATTEMPTS} attempts, it may be leaked: {e}"
+                )
+            except APIError as e:
+                logger.error(f"OpenAI rejected deleting file {openai_file_id}: {e}")
 
-            if not row:
-                logger.warning(f"Attachment {attachment_id} not found for user {user_id}")
-                return
-
-            # Delete from OpenAI if file was uploaded
-            if row["openai_file_id"]:
-                try:
-                    await self.openai_client.files.delete(row["openai_file_id"])
-                    logger.info(f"Deleted OpenAI file {row['openai_file_id']}")
-                except Exception as e:
-                    logger.error(f"Failed to delete OpenAI file: {e}")
-
-            # Delete from database
-            await conn.execute(
-                "DELETE FROM public.uploads WHERE id = $1 AND user_id = $2",
-                attachment_id,
-                user_id,
-            )
+        # Delete from database
+        async with pool.acquire() as conn:
+            await conn.execute(_DELETE_UPLOAD, attachment_id, user_id)
+        forget_openai_file_id(attachment_id, user_id)
 
         logger.info(f"Deleted attachment {attachment_id}")
 
-    async def get_attachment(self, attachment_id: str, context: dict[str, Any]) -> Attachment | None:
+    async def get_attachment(
+        self, attachment_id: str, context: dict[str, Any]
+    ) -> Attachment | None:
         """Retrieve attachment metadata."""
         user_id = self._get_user_id(context)
         pool = await get_db_pool()
 
         async with pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                SELECT id, filename, byte_size, mime, openai_file_id, created_at
-                FROM public.uploads
-                WHERE id = $1 AND user_id = $2
-                """,
-                attachment_id,
-                user_id,
-            )
+            row = await conn.fetchrow(_SELECT_UPLOAD, attachment_id, user_id)
 
             if not row:
                 return None
@@ -175,44 +234,121 @@ class SupabaseAttachmentStore(AttachmentStore[dict[str, Any]]):
                     size_bytes=row["byte_size"],
                 )
 
+    async def begin_upload(
+        self,
+        attachment_id: str,
+        filename: str,
+        mime_type: str,
+        byte_size: int,
+        context: dict[str, Any],
+        lease: ConnectionLease | None = None,
+    ) -> bool:
+        """Record that the file for an attachment is being uploaded to OpenAI.
+
+        Returns False if the attachment ID already belongs to another user, or if its
+        file was already uploaded: re-uploading would orphan the existing OpenAI file.
+        """
+        user_id = self._get_user_id(context)
+
+        async with acquire_connection(lease) as conn:
+            row_id = await conn.fetchval(
+                _UPSERT_UPLOADING_FILE,
+                attachment_id,
+                user_id,
+                filename,
+                byte_size,
+                mime_type,
+                "uploading",
+            )
+
+        return row_id is not None
+
+    async def mark_upload_failed(self, attachment_id: str, context: dict[str, Any]) -> None:
+        """Flag an attachment whose upload to OpenAI did not complete."""
+        user_id = self._get_user_id(context)
+        pool = await get_db_pool()
+
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE public.uploads
+                SET status = $1, updated_at = now()
+                WHERE id = $2 AND user_id = $3
+                """,
+                "failed",
+                attachment_id,
+                user_id,
+            )
+
+    async def get_upload_status(
+        self,
+        attachment_id: str,
+        context: dict[str, Any],
+        lease: ConnectionLease | None = None,
+    ) -> dict[str, Any] | None:
+        """Return the upload status of an attachment, or None if it does not exist."""
+        user_id = self._get_user_id(context)
+
+        async with acquire_connection(lease) as conn:
+            row = await conn.fetchrow(_SELECT_UPLOAD_STATUS, attachment_id, user_id)
+
+        if not row:
+            return None
+
+        return {
+            "id": str(row["id"]),
+            "status": row["status"],
+            "openai_file_id": row["openai_file_id"],
+        }
+
     async def upload_file_to_openai(
         self,
         attachment_id: str,
-        file_bytes: bytes,
+        file: IO[bytes],
         filename: str,
         mime_type: str,
+        byte_size: int,
         context: dict[str, Any],
     ) -> str:
-        """Upload file to OpenAI Files API and update the attachment record."""
+        """Upload file to OpenAI Files API and update the attachment record.
+
+        ``file`` is streamed to OpenAI as-is, so callers can hand over the spooled
+        request upload without reading it into memory first.
+        """
         user_id = self._get_user_id(context)
 
         # Upload to OpenAI
         # Using purpose="assistants" instead of "user_data" to allow downloading file content later
         # Note: assistants purpose doesn't support expires_after, files are kept until explicitly deleted
-        file_response = await self.openai_client.files.create(
-            file=(filename, file_bytes, mime_type),
-            purpose="assistants",
-            expires_after={"anchor": "created_at", "seconds": 60 * 60 * 24 * 7},  # 7 days
-        )
+        start = file.tell()
+
+        async def create_file() -> FileObject:
+            # Rewind so a retried attempt sends the whole file again
+            file.seek(start)
+            return await self._openai_no_retry.files.create(
+                file=(filename, file, mime_type),
+                purpose="assistants",
+                expires_after={"anchor": "created_at", "seconds": 60 * 60 * 24 * 7},  # 7 days
+            )
+
+        file_response = await _retry_transient(create_file)
 
         openai_file_id = file_response.id
         logger.info(f"Uploaded file to OpenAI: {openai_file_id}")
 
-        # Update database with OpenAI file ID
+        # Create the attachment record, or complete it if one was already written
         pool = await get_db_pool()
         async with pool.acquire() as conn:
             await conn.execute(
-                """
-                UPDATE public.uploads
-                SET openai_file_id = $1, status = $2, updated_at = $3
-                WHERE id = $4 AND user_id = $5
-                """,
-                openai_file_id,
-                "uploaded",
-                datetime.now(),
+                _UPSERT_UPLOADED_FILE,
                 attachment_id,
                 user_id,
+                openai_file_id,
+                filename,
+                byte_size,
+                mime_type,
+                "uploaded",
             )
+        forget_openai_file_id(attachment_id, user_id)
 
         return openai_file_id
-
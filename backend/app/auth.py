@@ -2,13 +2,21 @@
 
 from __future__ import annotations
 
-from typing import Annotated
-
+import asyncio
+import base64
+import hashlib
+import time
+from functools import cached_property
+from typing import Annotated, Any
+
+import orjson
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from .database import get_user_id_from_auth_id
-from .supabase_client import create_supabase_auth_client
+from .coalesce import coalesce
+from .database import ConnectionLease, get_db_lease, get_user_id_from_auth_id
+from .supabase_client import get_supabase_auth_client
 
 security = HTTPBearer()
 
@@ -17,31 +25,73 @@ class AuthUser:
     """Authenticated user information from Supabase."""
 
     def __init__(
-        self, user_id: str, email: str | None, raw: dict, public_user_id: int | None = None
+        self, user_id: str, email: str | None, user: Any, public_user_id: int | None = None
     ):
         self.id = user_id
         self.email = email
-        self.raw = raw
         self.public_user_id = public_user_id
+        self._user = user
 
+    @cached_property
+    def raw(self) -> dict:
+        """The full Supabase user as a dict, dumped on first access only."""
+        user = self._user
+        return user.model_dump() if hasattr(user, "model_dump") else dict(user)
 
-async def get_current_user(
-    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
-) -> AuthUser:
-    """Validate JWT token from Supabase and return authenticated user.
 
-    Args:
-        credentials: HTTP Bearer token from Authorization header
+# Validated tokens are cached briefly so repeated requests with the same JWT (e.g. a
+# streaming ChatKit session) skip the Supabase round-trip and the public user lookup.
+_TOKEN_CACHE_TTL_SECONDS = 60
+_TOKEN_EXPIRY_MARGIN_SECONDS = 5
 
-    Returns:
-        AuthUser: Authenticated user information
+_token_cache: TTLCache[bytes, tuple[AuthUser, float]] = TTLCache(
+    maxsize=10_000, ttl=_TOKEN_CACHE_TTL_SECONDS
+)
+_pending_validations: dict[bytes, asyncio.Future[AuthUser]] = {}
 
-    Raises:
-        HTTPException: If token is invalid or user not found
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _token_expiry(token: str) -> float | None:
+    """Return the ``exp`` claim of a JWT without verifying it.
+
+    Only used to bound how long an already validated token stays cached.
     """
-    token = credentials.credentials
+    try:
+        payload = token.split(".")[1]
+        # orjson parses the decoded bytes directly; its JSONDecodeError is a ValueError
+        claims = orjson.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
 
-    supabase = create_supabase_auth_client()
+def _get_cached_user(key: bytes) -> AuthUser | None:
+    entry = _token_cache.get(key)
+    if entry is None:
+        return None
+    user, expires_at = entry
+    if expires_at <= time.time() + _TOKEN_EXPIRY_MARGIN_SECONDS:
+        _token_cache.pop(key, None)
+        return None
+    return user
+
+
+def _public_user_id_from_claims(app_metadata: dict | None) -> int | None:
+    """Read the public user ID stamped into a user's ``app_metadata``, if any."""
+    if not app_metadata:
+        return None
+    try:
+        return int(app_metadata["public_user_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def _validate_token(token: str, lease: ConnectionLease | None = None) -> AuthUser:
+    """Validate a JWT with Supabase and resolve the matching public user ID."""
+    supabase = get_supabase_auth_client()
 
     try:
         response = supabase.auth.get_user(token)
@@ -53,19 +103,17 @@ async def get_current_user(
                 detail="Token de autenticação inválido.",
             )
 
-        # Get the public user ID from the database
-        public_user_id = await get_user_id_from_auth_id(user.id)
-
-        if not public_user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Usuário não encontrado no banco de dados.",
-            )
+        # Users provisioned with an ``app_metadata.public_user_id`` claim need no lookup.
+        # app_metadata is used rather than user_metadata because users can edit the latter.
+        public_user_id = _public_user_id_from_claims(user.app_metadata)
+        if public_user_id is None:
+            # Get the public user ID from the database
+            public_user_id = await get_user_id_from_auth_id(user.id, lease)
 
         return AuthUser(
             user_id=user.id,
             email=user.email,
-            raw=user.model_dump() if hasattr(user, "model_dump") else dict(user),
+            user=user,
             public_user_id=public_user_id,
         )
 
@@ -78,6 +126,54 @@ async def get_current_user(
         ) from e
 
 
+async def _authenticate(token: str, lease: ConnectionLease | None = None) -> AuthUser:
+    """Return the user for ``token``, validating it at most once per cache window.
+
+    Concurrent requests carrying the same uncached token share a single validation.
+    """
+    key = _token_cache_key(token)
+    cached = _get_cached_user(key)
+    if cached is not None:
+        return cached
+
+    async def validate() -> AuthUser:
+        auth_user = await _validate_token(token, lease)
+        expires_at = _token_expiry(token)
+        # Users without a public profile yet are not cached so they are picked up once created.
+        if expires_at is not None and auth_user.public_user_id is not None:
+            _token_cache[key] = (auth_user, expires_at)
+        return auth_user
+
+    return await coalesce(_pending_validations, key, validate)
+
+
+async def get_current_user(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    lease: Annotated[ConnectionLease, Depends(get_db_lease)],
+) -> AuthUser:
+    """Validate JWT token from Supabase and return authenticated user.
+
+    Args:
+        credentials: HTTP Bearer token from Authorization header
+        lease: The request's connection lease, shared with the route handler
+
+    Returns:
+        AuthUser: Authenticated user information
+
+    Raises:
+        HTTPException: If token is invalid or user not found
+    """
+    auth_user = await _authenticate(credentials.credentials, lease)
+
+    if not auth_user.public_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Usuário não encontrado no banco de dados.",
+        )
+
+    return auth_user
+
+
 async def get_current_user_optional(
     request: Request,
 ) -> AuthUser | None:
@@ -97,24 +193,7 @@ async def get_current_user_optional(
 
     token = auth_header[7:]  # Remove "Bearer " prefix
 
-    supabase = create_supabase_auth_client()
-
     try:
-        response = supabase.auth.get_user(token)
-        user = response.user
-
-        if not user:
-            return None
-
-        # Get the public user ID from the database
-        public_user_id = await get_user_id_from_auth_id(user.id)
-
-        return AuthUser(
-            user_id=user.id,
-            email=user.email,
-            raw=user.model_dump() if hasattr(user, "model_dump") else dict(user),
-            public_user_id=public_user_id,
-        )
-
+        return await _authenticate(token)
     except Exception:
         return None
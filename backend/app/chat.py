@@ -25,9 +25,11 @@ from chatkit.types import (
     ThreadStreamEvent,
     UserMessageItem,
 )
+from openai import AsyncOpenAI
 from openai.types.responses import ResponseInputContentParam
 from pydantic import ConfigDict, Field
 
+from .config import settings
 from .constants import INSTRUCTIONS, MODEL
 from .facts import Fact, fact_store
 from .memory_store import MemoryStore
@@ -205,9 +207,6 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
     """ChatKit server wired up with the fact-recording tool and file attachments."""
 
     def __init__(self, openai_client: Any = None) -> None:
-        from openai import AsyncOpenAI
-        from .config import settings
-
         self.store: PostgresStore = PostgresStore()
 
         # Initialize OpenAI client
@@ -216,7 +215,7 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
         self.openai_client = openai_client
 
         # Initialize attachment store
-        self.attachment_store = SupabaseAttachmentStore(openai_client)
+        self.attachment_store: SupabaseAttachmentStore = SupabaseAttachmentStore(openai_client)
 
         # Initialize ChatKitServer with store and attachment_store
         super().__init__(self.store, attachment_store=self.attachment_store)
@@ -227,7 +226,8 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
         self.assistant = Agent[FactAgentContext](
             model=MODEL,
             name="ChatKit Guide",
-            instructions=INSTRUCTIONS + "\n\nYou have access to Code Interpreter to analyze files and perform computations when needed.",
+            instructions=INSTRUCTIONS
+            + "\n\nYou have access to Code Interpreter to analyze files and perform computations when needed.",
             tools=tools,  # type: ignore[arg-type]
             # Code interpreter is automatically available when files are provided in the input
         )
@@ -278,9 +278,9 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
 
     async def to_message_content(self, _input: Attachment) -> ResponseInputContentParam:
         # Handle image attachments by returning image_url content
-        if hasattr(_input, 'url') and _input.url:
+        if hasattr(_input, "url") and _input.url:
             return {"type": "image_url", "image_url": {"url": _input.url}}
-        elif hasattr(_input, 'file_id') and _input.file_id:
+        elif hasattr(_input, "file_id") and _input.file_id:
             return {"type": "file", "file_id": _input.file_id}
         else:
             raise RuntimeError("File attachments are not supported in this demo.")
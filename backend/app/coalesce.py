@@ -0,0 +1,92 @@
+"""Sharing one in-flight lookup between concurrent callers asking for the same key."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable, Mapping
+from functools import partial
+from typing import TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def _settled(pending: dict[K, asyncio.Future[V]], key: K, future: asyncio.Future[V]) -> None:
+    if pending.get(key) is future:
+        del pending[key]
+    if not future.cancelled():
+        # Mark it retrieved: with no waiters asyncio would log it as never retrieved
+        future.exception()
+
+
+async def coalesce(
+    pending: dict[K, asyncio.Future[V]], key: K, fetch: Callable[[], Awaitable[V]]
+) -> V:
+    """Return ``await fetch()``, sharing the call with anyone already fetching ``key``.
+
+    ``pending`` holds the lookups in flight and is owned by the caller, one dict per
+    kind of lookup. The fetch runs in a task of its own, so cancelling the caller that
+    started it (say, on a client disconnect) does not fail the others waiting on it.
+    """
+    in_flight = pending.get(key)
+    if in_flight is None:
+        in_flight = pending[key] = asyncio.ensure_future(fetch())
+        in_flight.add_done_callback(partial(_settled, pending, key))
+    # shield: a cancelled waiter must not cancel the lookup other callers share
+    return await asyncio.shield(in_flight)
+
+
+def _settle_many(
+    pending: dict[K, asyncio.Future[V | None]],
+    futures: dict[K, asyncio.Future[V | None]],
+    task: asyncio.Future[Mapping[K, V]],
+) -> None:
+    for key, future in futures.items():
+        if pending.get(key) is future:
+            del pending[key]
+        if task.cancelled():
+            future.cancel()
+        elif (exc := task.exception()) is not None:
+            future.set_exception(exc)
+            # Mark it retrieved: with no waiters asyncio would log it as never retrieved
+            future.exception()
+        else:
+            future.set_result(task.result().get(key))
+
+
+async def coalesce_many(
+    pending: dict[K, asyncio.Future[V | None]],
+    keys: Iterable[K],
+    fetch: Callable[[list[K]], Awaitable[Mapping[K, V]]],
+) -> dict[K, V]:
+    """Look up several keys, fetching only those no other caller is fetching already.
+
+    ``fetch`` receives the keys nobody has in flight and returns the values it found;
+    keys it leaves out are missing from the result. Keys in flight elsewhere are
+    awaited instead, so concurrent batches that overlap query each key once. The
+    futures in ``pending`` resolve to None for keys that were not found, which lets
+    single-key lookups through :func:`coalesce` share the same dict.
+    """
+    waiting: dict[K, asyncio.Future[V | None]] = {}
+    owned: dict[K, asyncio.Future[V | None]] = {}
+    loop = asyncio.get_running_loop()
+    for key in keys:
+        if key in waiting:
+            continue
+        in_flight = pending.get(key)
+        if in_flight is None:
+            in_flight = owned[key] = pending[key] = loop.create_future()
+        waiting[key] = in_flight
+
+    if owned:
+        # As in coalesce, the fetch outlives a cancelled caller that started it
+        task = asyncio.ensure_future(fetch(list(owned)))
+        task.add_done_callback(partial(_settle_many, pending, owned))
+
+    found: dict[K, V] = {}
+    for key, in_flight in waiting.items():
+        # shield: a cancelled waiter must not cancel the lookup other callers share
+        value = await asyncio.shield(in_flight)
+        if value is not None:
+            found[key] = value
+    return found
@@ -2,6 +2,10 @@
 
 from __future__ import annotations
 
+import os
+from functools import lru_cache
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -17,6 +21,15 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str
+    db_pool_min_size: int = 2
+    # Sized for connection-bound workloads: roughly two connections per core plus one,
+    # but never below the previous fixed maximum of 10.
+    db_pool_max_size: int = Field(default_factory=lambda: max(10, (os.cpu_count() or 1) * 2 + 1))
+    db_statement_cache_size: int = 2048
+    # 0 lifts asyncpg's 15 KiB cap, so long queries are cached like the short ones
+    db_max_cacheable_statement_size: int = 0
+    db_max_inactive_connection_lifetime: float = 300.0
+    db_command_timeout: float = 30.0
 
     # Supabase
     supabase_url: str
@@ -27,14 +40,24 @@ class Settings(BaseSettings):
     openai_api_key: str
     default_model: str = "gpt-4o-mini"
     openai_base_url: str | None = None
+    # Upper bound on concurrent OpenAI file uploads per process
+    max_concurrent_uploads: int = 8
 
     # Server
     port: int = 8000
     host: str = "0.0.0.0"
     environment: str = "development"
+    # Largest /chatkit request body accepted before it is read into memory
+    max_chatkit_body_bytes: int = 20 * 1024 * 1024
 
     # Admin
     admin_api_key: str | None = None
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings, reading the environment and ``.env`` once."""
+    return Settings()
+
+
+settings = get_settings()
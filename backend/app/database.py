@@ -2,12 +2,85 @@
 
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any
+
 import asyncpg
+import orjson
+from cachetools import LRUCache
 
 from .config import settings
 
 _pool: asyncpg.Pool | None = None
 
+# json/jsonb use asyncpg's binary wire format. For json that is the JSON text itself;
+# jsonb prefixes it with a one-byte format version (currently 1). Values that are
+# already serialized JSON bytes (e.g. from a Pydantic serializer) are sent as is.
+_JSONB_VERSION = b"\x01"
+
+
+def _encode_json(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return orjson.dumps(value)
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    return _JSONB_VERSION + _encode_json(value)
+
+
+def _decode_jsonb(data: bytes) -> Any:
+    return orjson.loads(memoryview(data)[1:])
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Register JSON codecs on a new connection."""
+    # json/jsonb values are decoded to Python objects (and encoded from them) by asyncpg
+    # itself, so callers pass dicts (or pre-serialized JSON bytes) and receive dicts.
+    await conn.set_type_codec(
+        "json",
+        encoder=_encode_json,
+        decoder=orjson.loads,
+        schema="pg_catalog",
+        format="binary",
+    )
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        schema="pg_catalog",
+        format="binary",
+    )
+
+
+# Queries are kept as module-level constants: asyncpg caches the prepared statement
+# for each distinct SQL text per connection (statement_cache_size), so constant text
+# is planned once per connection on first use and reused afterwards.
+_SELECT_USER_ID = """
+    SELECT id FROM public.users
+    WHERE auth_user_id = $1
+    LIMIT 1
+"""
+
+# auth_user_id -> public user ID never changes once a user is provisioned, so found
+# IDs are kept for the life of the process. Misses are not cached: the public user
+# may be created after the first lookup.
+_user_id_cache: LRUCache[str, int] = LRUCache(maxsize=10_000)
+
+_SELECT_THREAD_ID = """
+    SELECT id FROM public.threads
+    WHERE openai_conversation_id = $1 AND user_id = $2
+"""
+
+# (openai_conversation_id, user_id) -> threads.id for the current request. The request
+# middleware installs a fresh dict per request, so repeated writes to one thread within
+# a request resolve it once; outside a request scope nothing is cached.
+_thread_id_cache: ContextVar[dict[tuple[str, int], int] | None] = ContextVar(
+    "thread_id_cache", default=None
+)
+
 
 async def get_db_pool() -> asyncpg.Pool:
     """Get or create the database connection pool."""
@@ -15,8 +88,13 @@ async def get_db_pool() -> asyncpg.Pool:
     if _pool is None:
         _pool = await asyncpg.create_pool(
             settings.database_url,
-            min_size=2,
-            max_size=10,
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            statement_cache_size=settings.db_statement_cache_size,
+            max_cacheable_statement_size=settings.db_max_cacheable_statement_size,
+            max_inactive_connection_lifetime=settings.db_max_inactive_connection_lifetime,
+            command_timeout=settings.db_command_timeout,
+            init=_init_connection,
         )
     return _pool
 
@@ -29,23 +107,111 @@ async def close_db_pool() -> None:
         _pool = None
 
 
-async def get_user_id_from_auth_id(auth_user_id: str) -> int | None:
+class ConnectionLease:
+    """A pool connection acquired on first use and shared for the rest of a request.
+
+    Auth and the route handler receive the same lease, so a request that needs the
+    database acquires one connection instead of one per helper, and a request that
+    never touches the database acquires none. A lease must not be used by concurrent
+    tasks: asyncpg connections run one query at a time.
+    """
+
+    def __init__(self) -> None:
+        self._conn: asyncpg.Connection | None = None
+
+    async def connection(self) -> asyncpg.Connection:
+        """Return the leased connection, acquiring it from the pool if needed."""
+        if self._conn is None:
+            pool = await get_db_pool()
+            self._conn = await pool.acquire()
+        return self._conn
+
+    async def release(self) -> None:
+        """Hand the connection back to the pool; a later call re-acquires one."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            pool = await get_db_pool()
+            await pool.release(conn)
+
+
+async def get_db_lease() -> AsyncIterator[ConnectionLease]:
+    """FastAPI dependency yielding the request's ``ConnectionLease``."""
+    lease = ConnectionLease()
+    try:
+        yield lease
+    finally:
+        await lease.release()
+
+
+@asynccontextmanager
+async def acquire_connection(
+    lease: ConnectionLease | None = None,
+) -> AsyncIterator[asyncpg.Connection]:
+    """Yield the lease's connection if one is given, otherwise one from the pool."""
+    if lease is not None:
+        yield await lease.connection()
+        return
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        yield conn
+
+
+async def get_user_id_from_auth_id(
+    auth_user_id: str, lease: ConnectionLease | None = None
+) -> int | None:
     """Get the public user ID from the Supabase auth user ID.
 
     Args:
         auth_user_id: The Supabase auth user ID (UUID)
+        lease: The request's connection lease, if any
 
     Returns:
         The public user ID (bigint) or None if not found
     """
-    pool = await get_db_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            """
-            SELECT id FROM public.users
-            WHERE auth_user_id = $1
-            LIMIT 1
-            """,
-            auth_user_id,
-        )
-        return row["id"] if row else None
+    cached = _user_id_cache.get(auth_user_id)
+    if cached is not None:
+        return cached
+
+    async with acquire_connection(lease) as conn:
+        row = await conn.fetchrow(_SELECT_USER_ID, auth_user_id)
+
+    if not row:
+        return None
+    _user_id_cache[auth_user_id] = row["id"]
+    return row["id"]
+
+
+def begin_request_scope() -> None:
+    """Start a fresh per-request thread ID cache in the current context."""
+    _thread_id_cache.set({})
+
+
+async def resolve_thread_id(conn: asyncpg.Connection, thread_id: str, user_id: int) -> int | None:
+    """Resolve a ChatKit thread ID to its database ID, checking ownership.
+
+    Args:
+        conn: The connection to run the lookup on
+        thread_id: The ChatKit thread ID (openai_conversation_id)
+        user_id: The user ID for authorization
+
+    Returns:
+        The thread's database ID, or None if not found or not owned by the user
+    """
+    cache = _thread_id_cache.get()
+    key = (thread_id, user_id)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    db_thread_id = await conn.fetchval(_SELECT_THREAD_ID, thread_id, user_id)
+    if cache is not None and db_thread_id is not None:
+        cache[key] = db_thread_id
+    return db_thread_id
+
+
+def forget_thread_id(thread_id: str, user_id: int) -> None:
+    """Drop a thread from the per-request cache, e.g. after deleting it."""
+    cache = _thread_id_cache.get()
+    if cache is not None:
+        cache.pop((thread_id, user_id), None)
@@ -2,23 +2,96 @@
 
 from __future__ import annotations
 
-from typing import Annotated, Any
+import asyncio
+import logging
+import secrets
+import shutil
+import tempfile
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import IO, Annotated, Any
+from urllib.parse import urlsplit
 
 from chatkit.server import StreamingResult
-from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, StreamingResponse
-from starlette.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from openai.types import FileObject
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from .auth import AuthUser, get_current_user
 from .chat import (
     FactAssistantServer,
     create_chatkit_server,
 )
+from .config import settings
+from .database import (
+    ConnectionLease,
+    begin_request_scope,
+    close_db_pool,
+    get_db_lease,
+    get_db_pool,
+)
 from .facts import fact_store
+from .supabase_client import get_supabase_auth_client
 from .thread_file_manager import ThreadFileManager
 
-app = FastAPI(title="ChatKit API")
+logger = logging.getLogger(__name__)
+
+
+async def _resolve_hosts(*urls: str) -> None:
+    """Resolve the hosts of ``urls`` so the first outbound request skips the DNS lookup."""
+    loop = asyncio.get_running_loop()
+    for url in urls:
+        host = urlsplit(url).hostname
+        if not host:
+            continue
+        try:
+            await loop.getaddrinfo(host, 443)
+        except OSError as e:
+            logger.warning(f"Could not resolve {host} at startup: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build the shared pool and clients before serving and close them on shutdown."""
+    try:
+        await get_db_pool()
+    except Exception:
+        # Not fatal: get_db_pool() retries on the first request that needs it.
+        logger.exception("Could not open the database pool at startup")
+
+    app.state.supabase = get_supabase_auth_client()
+    app.state.openai_client = _chatkit_server.openai_client if _chatkit_server else None
+    await _resolve_hosts(
+        settings.openai_base_url or "https://api.openai.com/v1",
+        settings.supabase_url,
+    )
+
+    yield
+
+    await close_db_pool()
+    if app.state.openai_client is not None:
+        await app.state.openai_client.close()
+
+
+app = FastAPI(
+    title="ChatKit API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # Configure CORS
 app.add_middleware(
@@ -31,6 +104,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class RequestScopeMiddleware:
+    """Give each HTTP request its own thread ID cache (see ``resolve_thread_id``).
+
+    Plain ASGI rather than ``@app.middleware``, so streamed responses aren't re-wrapped.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            begin_request_scope()
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(RequestScopeMiddleware)
+
+
 _chatkit_server: FactAssistantServer | None = create_chatkit_server()
 
 
@@ -46,19 +138,48 @@ def get_chatkit_server() -> FactAssistantServer:
     return _chatkit_server
 
 
+async def _read_chatkit_body(request: Request) -> bytearray:
+    """Read the request body, rejecting it with 413 once it exceeds the configured limit.
+
+    ``ChatKitServer.process`` only accepts the complete payload, so the body still has to
+    be buffered; the limit keeps oversized requests from being buffered at all.
+    """
+    limit = settings.max_chatkit_body_bytes
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body exceeds {limit} bytes",
+    )
+
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+        raise too_large
+
+    # Count as we go as well: chunked requests carry no Content-Length.
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    return body
+
+
 @app.post("/chatkit")
 async def chatkit_endpoint(
     request: Request,
     server: FactAssistantServer = Depends(get_chatkit_server),
     current_user: AuthUser = Depends(get_current_user),
+    lease: ConnectionLease = Depends(get_db_lease),
 ) -> Response:
-    payload = await request.body()
+    payload = await _read_chatkit_body(request)
+    # The ChatKit store uses its own pool connections; don't hold the request's one
+    # while the agent runs.
+    await lease.release()
     result = await server.process(payload, {"request": request, "user": current_user})
     if isinstance(result, StreamingResult):
         return StreamingResponse(result, media_type="text/event-stream")
     if hasattr(result, "json"):
         return Response(content=result.json, media_type="application/json")
-    return JSONResponse(result)
+    return ORJSONResponse(result)
 
 
 @app.get("/facts")
@@ -96,41 +217,196 @@ async def health_check() -> dict[str, str]:
     return {"status": "healthy"}
 
 
-@app.post("/api/attachments/{attachment_id}/upload")
+@app.get("/debug/pool")
+async def pool_stats(
+    x_admin_key: Annotated[str | None, Header()] = None,
+) -> dict[str, int]:
+    """Report database pool usage; requires the ``X-Admin-Key`` header."""
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=404, detail="Not found")
+    if x_admin_key is None or not secrets.compare_digest(x_admin_key, settings.admin_api_key):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+    pool = await get_db_pool()
+    return {
+        "size": pool.get_size(),
+        "idle": pool.get_idle_size(),
+        "min_size": pool.get_min_size(),
+        "max_size": pool.get_max_size(),
+    }
+
+
+# Caps how many OpenAI file uploads (two-phase and direct) run at once in this process.
+_upload_slots = asyncio.Semaphore(settings.max_concurrent_uploads)
+# Two-phase uploads are forwarded to OpenAI in the background; the task set keeps a
+# reference to each one until it finishes.
+_background_uploads: set[asyncio.Task[None]] = set()
+
+
+async def _upload_in_background(
+    server: FactAssistantServer,
+    attachment_id: str,
+    spool: IO[bytes],
+    filename: str,
+    mime_type: str,
+    byte_size: int,
+    context: dict[str, Any],
+) -> None:
+    """Upload a spooled file to OpenAI and record the outcome on the attachment."""
+    try:
+        async with _upload_slots:
+            await server.attachment_store.upload_file_to_openai(
+                attachment_id=attachment_id,
+                file=spool,
+                filename=filename,
+                mime_type=mime_type,
+                byte_size=byte_size,
+                context=context,
+            )
+    except Exception:
+        logger.exception(f"Background upload failed for attachment {attachment_id}")
+        try:
+            await server.attachment_store.mark_upload_failed(attachment_id, context)
+        except Exception:
+            # Nothing awaits this task, so log here rather than lose the error
+            logger.exception(f"Could not mark attachment {attachment_id} as failed")
+    finally:
+        spool.close()
+
+
+@app.post("/api/attachments/{attachment_id}/upload", status_code=status.HTTP_202_ACCEPTED)
 async def upload_attachment(
     attachment_id: str,
     file: UploadFile = File(...),
     server: FactAssistantServer = Depends(get_chatkit_server),
     current_user: AuthUser = Depends(get_current_user),
+    lease: ConnectionLease = Depends(get_db_lease),
 ) -> dict[str, Any]:
     """
     Phase 2 of two-phase upload: Upload the actual file bytes.
     This endpoint is called after the attachment is created via ChatKit.
+
+    The file is forwarded to OpenAI in the background; poll
+    ``GET /api/attachments/{attachment_id}`` until its status is "uploaded".
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="Filename is required")
 
-    # Read file content
-    content = await file.read()
+    mime_type = file.content_type or "application/octet-stream"
+    context = {"user": current_user}
 
+    # The request's UploadFile is closed once the response is sent, so move the bytes
+    # to a spooled file owned by the background task.
+    await file.seek(0)
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
     try:
-        # Upload to OpenAI and update database
-        openai_file_id = await server.attachment_store.upload_file_to_openai(
+        await run_in_threadpool(shutil.copyfileobj, file.file, spool)
+        byte_size = spool.tell()
+        spool.seek(0)
+
+        started = await server.attachment_store.begin_upload(
             attachment_id=attachment_id,
-            file_bytes=content,
             filename=file.filename,
-            mime_type=file.content_type or "application/octet-stream",
-            context={"user": current_user},
+            mime_type=mime_type,
+            byte_size=byte_size,
+            context=context,
+            lease=lease,
         )
-
-        return {
-            "id": attachment_id,
-            "openai_file_id": openai_file_id,
-            "status": "uploaded",
-        }
     except Exception as e:
+        spool.close()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+    if not started:
+        spool.close()
+        raise HTTPException(status_code=404, detail="Attachment not found or already uploaded")
+
+    task = asyncio.create_task(
+        _upload_in_background(
+            server, attachment_id, spool, file.filename, mime_type, byte_size, context
+        )
+    )
+    _background_uploads.add(task)
+    task.add_done_callback(_background_uploads.discard)
+
+    return {
+        "id": attachment_id,
+        "status": "uploading",
+    }
+
+
+@app.get("/api/attachments/{attachment_id}")
+async def get_attachment_status(
+    attachment_id: str,
+    server: FactAssistantServer = Depends(get_chatkit_server),
+    current_user: AuthUser = Depends(get_current_user),
+    lease: ConnectionLease = Depends(get_db_lease),
+) -> dict[str, Any]:
+    """Report the upload status of an attachment (uploading, uploaded or failed)."""
+    upload = await server.attachment_store.get_upload_status(
+        attachment_id, {"user": current_user}, lease
+    )
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return upload
+
+
+_INSERT_PENDING_UPLOAD = """
+    INSERT INTO public.uploads (user_id, filename, byte_size, mime, status)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id, created_at
+"""
+
+_MARK_UPLOAD_COMPLETE = """
+    UPDATE public.uploads
+    SET openai_file_id = $1, status = $2, byte_size = $3, updated_at = now()
+    WHERE id = $4
+"""
+
+
+async def _insert_pending_upload(
+    user_id: int, filename: str, byte_size: int, mime_type: str
+) -> tuple[str, datetime]:
+    """Insert an upload row before its OpenAI file exists.
+
+    Returns the generated ID and the ``created_at`` timestamp set by the database.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        # Insert and get the auto-generated UUID
+        row = await conn.fetchrow(
+            _INSERT_PENDING_UPLOAD,
+            user_id,
+            filename,
+            byte_size,
+            mime_type,
+            "pending",
+        )
+        return str(row["id"]), row["created_at"]
+
+
+async def _mark_upload_complete(attachment_id: str, openai_file_id: str, byte_size: int) -> None:
+    """Record the OpenAI file ID and final size on a pending upload row."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            _MARK_UPLOAD_COMPLETE,
+            openai_file_id,
+            "uploaded",
+            byte_size,
+            attachment_id,
+        )
+
+
+async def _mark_upload_failed(attachment_id: str) -> None:
+    """Flag a pending upload row whose OpenAI upload did not complete."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "UPDATE public.uploads SET status = $1, updated_at = now() WHERE id = $2",
+            "failed",
+            attachment_id,
+        )
+
 
 @app.post("/api/uploads/direct")
 async def direct_upload(
@@ -139,13 +415,15 @@ async def direct_upload(
     thread_id: str = Form(None),
     server: FactAssistantServer = Depends(get_chatkit_server),
     current_user: AuthUser = Depends(get_current_user),
+    lease: ConnectionLease = Depends(get_db_lease),
 ) -> dict[str, Any]:
     """
     Direct upload endpoint: Creates attachment and uploads file in one step.
     This is an alternative to two-phase upload.
     """
-    import logging
-    logger = logging.getLogger(__name__)
+    # The writes below run concurrently on their own pool connections; don't hold the
+    # request's one for the duration of the OpenAI upload.
+    await lease.release()
 
     # Log request details for debugging
     logger.info(f"Direct upload request - filename: {file.filename}, thread_id: {thread_id}")
@@ -159,72 +437,83 @@ async def direct_upload(
         thread_id = form_data.get("thread_id") or form_data.get("threadId") or "unknown"
         logger.info(f"Thread ID extracted from form: {thread_id}")
 
-    # Read file content
-    content = await file.read()
+    # Stream the spooled upload straight to OpenAI instead of buffering it in memory.
+    # The stream stays seekable, so a retried request can rewind and resend it whole;
+    # Starlette records the size when it parses the multipart body.
+    await file.seek(0)
 
     try:
-        # Upload directly to OpenAI Files API
-        from openai import AsyncOpenAI
-        from .config import settings
+        # Upload directly to OpenAI Files API with the server's shared client
+        openai_client = server.attachment_store.openai_client
 
-        openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
-
-        # Upload to OpenAI with 7-day expiration
-        # Using purpose="assistants" instead of "user_data" to allow downloading file content later
-        file_response = await openai_client.files.create(
-            file=(file.filename, content, file.content_type or "application/octet-stream"),
-            purpose="assistants",
-        )
+        # Store metadata in database
+        user_id = int(current_user.public_user_id)
 
-        openai_file_id = file_response.id
-        logger.info(f"Uploaded file to OpenAI: {openai_file_id}")
+        filename = file.filename
 
-        # Store metadata in database
-        from datetime import datetime
-        from .database import get_db_pool
+        async def upload_to_openai() -> FileObject:
+            async with _upload_slots:
+                # Using purpose="assistants" instead of "user_data" to allow downloading
+                # file content later
+                return await openai_client.files.create(
+                    file=(filename, file.file, file.content_type or "application/octet-stream"),
+                    purpose="assistants",
+                )
 
-        user_id = int(current_user.public_user_id)
-        now = datetime.now()
-
-        pool = await get_db_pool()
-        async with pool.acquire() as conn:
-            # Insert and get the auto-generated UUID
-            row = await conn.fetchrow(
-                """
-                INSERT INTO public.uploads (user_id, openai_file_id, filename, byte_size, mime, status, created_at, updated_at)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                RETURNING id
-                """,
+        # The OpenAI upload and the metadata INSERT are independent, so run them
+        # concurrently and fill in the OpenAI file ID once both have finished.
+        file_response, pending_upload = await asyncio.gather(
+            upload_to_openai(),
+            _insert_pending_upload(
                 user_id,
-                openai_file_id,
                 file.filename,
-                len(content),
+                file.size or 0,
                 file.content_type or "application/octet-stream",
-                "uploaded",
-                now,
-                now,
-            )
-            attachment_id = str(row["id"])
+            ),
+            return_exceptions=True,
+        )
+        if isinstance(file_response, BaseException):
+            if not isinstance(pending_upload, BaseException):
+                await _mark_upload_failed(pending_upload[0])
+            raise file_response
+        if isinstance(pending_upload, BaseException):
+            # Nothing will reference the uploaded file: delete it (best effort, no
+            # retries) so a database failure doesn't leave an orphan in OpenAI.
+            try:
+                await openai_client.with_options(max_retries=0).files.delete(file_response.id)
+            except Exception as e:
+                logger.error(f"Could not delete orphaned OpenAI file {file_response.id}: {e}")
+            raise pending_upload
+        attachment_id, created_at = pending_upload
+
+        openai_file_id = file_response.id
+        size_bytes = file.size or 0
+        logger.info(f"Uploaded file to OpenAI: {openai_file_id}")
 
-        # Attach to thread if thread_id is provided
-        if thread_id and thread_id != "unknown":
+        async def attach_to_thread() -> None:
+            # Attach to thread if thread_id is provided
+            if not thread_id or thread_id == "unknown":
+                return
             try:
-                await ThreadFileManager.attach_file_to_thread(
-                    thread_id, openai_file_id, user_id
-                )
+                await ThreadFileManager.attach_file_to_thread(thread_id, openai_file_id, user_id)
                 logger.info(f"Attached file to thread {thread_id}")
             except Exception as e:
                 logger.warning(f"Could not attach file to thread: {e}")
 
+        await asyncio.gather(
+            _mark_upload_complete(attachment_id, openai_file_id, size_bytes),
+            attach_to_thread(),
+        )
+
         # Return response in ChatKit format
         return {
             "id": attachment_id,
             "name": file.filename,
             "mime_type": file.content_type or "application/octet-stream",
-            "size_bytes": len(content),
+            "size_bytes": size_bytes,
             "openai_file_id": openai_file_id,
             "thread_id": thread_id,
-            "created_at": now.isoformat(),
+            "created_at": created_at.isoformat(),
         }
 
     except Exception as e:
@@ -236,10 +525,11 @@ async def direct_upload(
 async def get_thread_files(
     thread_id: str,
     current_user: AuthUser = Depends(get_current_user),
+    lease: ConnectionLease = Depends(get_db_lease),
 ) -> dict[str, Any]:
     """Get all files attached to a thread."""
     user_id = int(current_user.public_user_id)
-    files = await ThreadFileManager.get_thread_files(thread_id, user_id)
+    files = await ThreadFileManager.get_thread_files(thread_id, user_id, lease)
     return {"files": files}
 
 
@@ -248,13 +538,14 @@ async def attach_file_to_thread(
     thread_id: str,
     openai_file_id: str = Form(...),
     current_user: AuthUser = Depends(get_current_user),
+    lease: ConnectionLease = Depends(get_db_lease),
 ) -> dict[str, Any]:
     """Attach an uploaded file to a thread."""
     user_id = int(current_user.public_user_id)
 
     try:
         result = await ThreadFileManager.attach_file_to_thread(
-            thread_id, openai_file_id, user_id
+            thread_id, openai_file_id, user_id, lease
         )
         return result
     except ValueError as e:
@@ -266,17 +557,16 @@ async def detach_file_from_thread(
     thread_id: str,
     openai_file_id: str,
     current_user: AuthUser = Depends(get_current_user),
+    lease: ConnectionLease = Depends(get_db_lease),
 ) -> dict[str, Any]:
     """Remove a file from a thread."""
     user_id = int(current_user.public_user_id)
 
     deleted = await ThreadFileManager.detach_file_from_thread(
-        thread_id, openai_file_id, user_id
+        thread_id, openai_file_id, user_id, lease
     )
 
     if not deleted:
         raise HTTPException(status_code=404, detail="File association not found")
 
     return {"success": True, "message": "File detached from thread"}
-
-
@@ -2,34 +2,78 @@
 
 This version uses a simplified schema where ThreadItem objects are stored directly
 in a JSONB column, eliminating the need for role/content extraction and conversion logic.
+
+The queries below rely on these indexes (see ``backend/migrations``); keep them in sync:
+
+- ``threads_user_id_openai_conversation_id_key`` UNIQUE (user_id, openai_conversation_id):
+  thread lookups and the save_thread upsert (009)
+- ``messages_thread_id_openai_message_id_key`` UNIQUE (thread_id, openai_message_id):
+  item lookups and the save_item upsert (009)
+- ``threads_user_created_id`` (user_id, created_at DESC, openai_conversation_id DESC):
+  load_threads keyset pagination (010)
+- ``messages_thread_created_id`` (thread_id, created_at DESC, openai_message_id DESC):
+  load_thread_items keyset pagination (010)
+
+Deleting a thread relies on the ON DELETE CASCADE foreign keys from messages and
+thread_files (013).
 """
 
 from __future__ import annotations
 
-import json
+import base64
 from datetime import datetime
+from itertools import islice
 from typing import Any
 
 from pydantic import TypeAdapter
 from chatkit.store import NotFoundError, Store
-from chatkit.types import Attachment, Page, Thread, ThreadItem, ThreadMetadata
+from chatkit.types import (
+    Attachment,
+    FileAttachment,
+    ImageAttachment,
+    Page,
+    Thread,
+    ThreadItem,
+    ThreadMetadata,
+)
 
-from .database import get_db_pool
+from .database import forget_thread_id, get_db_pool, resolve_thread_id
+from .thread_item_converter import forget_openai_file_id
 
 
 # TypeAdapter for converting dictionaries to ThreadItem objects
 _thread_item_adapter = TypeAdapter(ThreadItem)
+# Bound once so per-row validation skips the attribute lookup
+_validate_thread_item = _thread_item_adapter.validate_python
+
+
+def _thread_item_from_row(thread_id: str, row: Any) -> ThreadItem:
+    """Build the ThreadItem for a messages row."""
+    item_data = row["item"]
+
+    # Ensure consistency with database values
+    item_data["id"] = row["openai_message_id"]
+    item_data["thread_id"] = thread_id
+
+    # Convert to Pydantic object
+    return _validate_thread_item(item_data)
 
 
-def _serialize_for_json(obj: Any) -> Any:
-    """Recursively convert datetime objects to ISO format strings for JSON serialization."""
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    elif isinstance(obj, dict):
-        return {key: _serialize_for_json(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [_serialize_for_json(item) for item in obj]
-    return obj
+# Page cursors carry the (created_at, ChatKit ID) keyset of the last row returned, so the
+# next page is a single range query with stable ordering on created_at ties.
+def _encode_cursor(created_at: datetime, key: str) -> str:
+    raw = f"{created_at.isoformat()}|{key}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str] | None:
+    """Return the keyset in ``cursor``, or None if it is a plain (legacy) thread/item ID."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, key = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), key
+    except ValueError:
+        return None
 
 
 class PostgresStoreSimplified(Store[dict[str, Any]]):
@@ -37,16 +81,21 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
 
     @staticmethod
     def _coerce_thread_metadata(thread: ThreadMetadata | Thread) -> ThreadMetadata:
-        """Return thread metadata without any embedded items."""
+        """Return thread metadata without any embedded items.
+
+        No copy is made when there are no items: save_thread only reads the fields and
+        serializes them into the query, so the caller's object is never retained.
+        """
         has_items = isinstance(thread, Thread) or "items" in getattr(
             thread, "model_fields_set", set()
         )
         if not has_items:
-            return thread.model_copy(deep=True)
+            return thread
 
+        # model_dump already builds fresh containers, so the new model shares nothing
         data = thread.model_dump()
         data.pop("items", None)
-        return ThreadMetadata(**data).model_copy(deep=True)
+        return ThreadMetadata(**data)
 
     @staticmethod
     def _get_user_id(context: dict[str, Any]) -> int:
@@ -70,7 +119,7 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
         async with pool.acquire() as conn:
             row = await conn.fetchrow(
                 """
-                SELECT id, user_id, title, metadata, created_at, updated_at, openai_conversation_id
+                SELECT title, metadata, created_at
                 FROM public.threads
                 WHERE openai_conversation_id = $1 AND user_id = $2
                 """,
@@ -85,7 +134,7 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
                 id=thread_id,
                 created_at=row["created_at"],
                 title=row["title"],
-                metadata=json.loads(row["metadata"]) if isinstance(row["metadata"], str) else (row["metadata"] or {}),
+                metadata=row["metadata"] or {},
             )
 
     async def save_thread(self, thread: ThreadMetadata, context: dict[str, Any]) -> None:
@@ -95,39 +144,21 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
         pool = await get_db_pool()
 
         async with pool.acquire() as conn:
-            existing = await conn.fetchrow(
-                "SELECT id FROM public.threads WHERE openai_conversation_id = $1 AND user_id = $2",
-                thread.id,
+            # Atomic upsert keyed by threads_user_id_openai_conversation_id_key
+            await conn.execute(
+                """
+                INSERT INTO public.threads
+                (user_id, openai_conversation_id, title, metadata, created_at, updated_at)
+                VALUES ($1, $2, $3, $4, now(), now())
+                ON CONFLICT (user_id, openai_conversation_id) DO UPDATE
+                SET title = EXCLUDED.title, metadata = EXCLUDED.metadata, updated_at = now()
+                """,
                 user_id,
+                thread.id,
+                metadata.title,
+                metadata.metadata or {},
             )
 
-            if existing:
-                await conn.execute(
-                    """
-                    UPDATE public.threads
-                    SET title = $1, metadata = $2, updated_at = $3
-                    WHERE openai_conversation_id = $4 AND user_id = $5
-                    """,
-                    metadata.title,
-                    json.dumps(metadata.metadata or {}),
-                    datetime.now(),
-                    thread.id,
-                    user_id,
-                )
-            else:
-                await conn.execute(
-                    """
-                    INSERT INTO public.threads (user_id, openai_conversation_id, title, metadata, created_at, updated_at)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                    """,
-                    user_id,
-                    thread.id,
-                    metadata.title,
-                    json.dumps(metadata.metadata or {}),
-                    datetime.now(),
-                    datetime.now(),
-                )
-
     async def load_threads(
         self,
         limit: int,
@@ -139,84 +170,74 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
         pool = await get_db_pool()
         order_clause = "DESC" if order == "desc" else "ASC"
 
-        async with pool.acquire() as conn:
-            if after:
-                after_row = await conn.fetchrow(
-                    "SELECT created_at FROM public.threads WHERE openai_conversation_id = $1",
-                    after,
-                )
-                if not after_row:
-                    rows = []
-                else:
-                    after_time = after_row["created_at"]
-                    comparison = "<" if order == "desc" else ">"
-                    rows = await conn.fetch(
-                        f"""
-                        SELECT id, user_id, title, metadata, created_at, updated_at, openai_conversation_id
-                        FROM public.threads
-                        WHERE user_id = $1 AND created_at {comparison} $2
-                        ORDER BY created_at {order_clause}
-                        LIMIT $3
-                        """,
-                        user_id,
-                        after_time,
-                        limit + 1,
-                    )
+        comparison = "<" if order == "desc" else ">"
+
+        params: list[Any] = [user_id]
+        after_filter = ""
+        if after:
+            keyset = _decode_cursor(after)
+            if keyset is not None:
+                params.extend(keyset)
+                after_filter = f"AND (created_at, openai_conversation_id) {comparison} ($2, $3)"
             else:
-                rows = await conn.fetch(
-                    f"""
-                    SELECT id, user_id, title, metadata, created_at, updated_at, openai_conversation_id
-                    FROM public.threads
-                    WHERE user_id = $1
-                    ORDER BY created_at {order_clause}
-                    LIMIT $2
-                    """,
-                    user_id,
-                    limit + 1,
-                )
+                # Legacy cursor holding a thread ID: resolve its keyset in the same query
+                params.append(after)
+                after_filter = f"""AND (created_at, openai_conversation_id) {comparison} (
+                    SELECT created_at, openai_conversation_id FROM public.threads
+                    WHERE openai_conversation_id = $2 AND user_id = $1
+                )"""
+        params.append(limit + 1)
 
-            has_more = len(rows) > limit
-            rows = rows[:limit]
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                f"""
+                SELECT openai_conversation_id, id, title, metadata, created_at
+                FROM public.threads
+                WHERE user_id = $1 {after_filter}
+                ORDER BY created_at {order_clause}, openai_conversation_id {order_clause}
+                LIMIT ${len(params)}
+                """,
+                *params,
+            )
 
-            threads = [
-                ThreadMetadata(
-                    id=row["openai_conversation_id"] or str(row["id"]),
-                    created_at=row["created_at"],
-                    title=row["title"],
-                    metadata=json.loads(row["metadata"]) if isinstance(row["metadata"], str) else (row["metadata"] or {}),
-                )
-                for row in rows
-            ]
+        # The cursor is taken from the last row the client actually receives (the
+        # limit-th one), so the next page starts strictly after it; the extra
+        # (limit + 1)th row only signals has_more.
+        has_more = len(rows) > limit
+        # Local binding keeps the per-row constructor lookup out of the globals
+        make_metadata = ThreadMetadata
+        threads = [
+            make_metadata(
+                id=row["openai_conversation_id"] or str(row["id"]),
+                created_at=row["created_at"],
+                title=row["title"],
+                metadata=row["metadata"] or {},
+            )
+            for row in islice(rows, limit)
+        ]
 
-            next_after = threads[-1].id if has_more and threads else None
-            return Page(data=threads, has_more=has_more, after=next_after)
+        next_after = None
+        if has_more and threads:
+            last_row = rows[limit - 1]
+            next_after = _encode_cursor(last_row["created_at"], last_row["openai_conversation_id"])
+        return Page(data=threads, has_more=has_more, after=next_after)
 
     async def delete_thread(self, thread_id: str, context: dict[str, Any]) -> None:
         user_id = self._get_user_id(context)
         pool = await get_db_pool()
+        forget_thread_id(thread_id, user_id)
 
         async with pool.acquire() as conn:
-            thread_row = await conn.fetchrow(
-                "SELECT id FROM public.threads WHERE openai_conversation_id = $1 AND user_id = $2",
+            # Messages and file associations go with it through ON DELETE CASCADE (013)
+            await conn.execute(
+                """
+                DELETE FROM public.threads
+                WHERE openai_conversation_id = $1 AND user_id = $2
+                """,
                 thread_id,
                 user_id,
             )
 
-            if not thread_row:
-                return
-
-            db_thread_id = thread_row["id"]
-
-            await conn.execute(
-                "DELETE FROM public.messages WHERE thread_id = $1",
-                db_thread_id,
-            )
-
-            await conn.execute(
-                "DELETE FROM public.threads WHERE id = $1",
-                db_thread_id,
-            )
-
     # -- Thread items - SIMPLIFIED VERSION ----------------------------------------------------
     async def load_thread_items(
         self,
@@ -228,73 +249,63 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
     ) -> Page[ThreadItem]:
         pool = await get_db_pool()
         order_clause = "DESC" if order == "desc" else "ASC"
+        comparison = "<" if order == "desc" else ">"
 
-        async with pool.acquire() as conn:
-            user_id = self._get_user_id(context)
-            thread_row = await conn.fetchrow(
-                "SELECT id FROM public.threads WHERE openai_conversation_id = $1 AND user_id = $2",
-                thread_id,
-                user_id,
-            )
-            if not thread_row:
-                raise NotFoundError(f"Thread {thread_id} not found")
-
-            db_thread_id = thread_row["id"]
-
-            # Build query
-            if after:
-                after_row = await conn.fetchrow(
-                    "SELECT created_at FROM public.messages WHERE openai_message_id = $1",
-                    after,
-                )
-                if not after_row:
-                    rows = []
-                else:
-                    after_time = after_row["created_at"]
-                    comparison = "<" if order == "desc" else ">"
-                    rows = await conn.fetch(
-                        f"""
-                        SELECT item, created_at, openai_message_id
-                        FROM public.messages
-                        WHERE thread_id = $1 AND created_at {comparison} $2
-                        ORDER BY created_at {order_clause}
-                        LIMIT $3
-                        """,
-                        db_thread_id,
-                        after_time,
-                        limit + 1,
-                    )
+        user_id = self._get_user_id(context)
+        params: list[Any] = [thread_id, user_id]
+        after_filter = ""
+        if after:
+            keyset = _decode_cursor(after)
+            if keyset is not None:
+                params.extend(keyset)
+                after_filter = f"AND (created_at, openai_message_id) {comparison} ($3, $4)"
             else:
-                rows = await conn.fetch(
-                    f"""
+                # Legacy cursor holding an item ID: resolve its keyset in the same query.
+                # An unknown ID compares against NULL and yields an empty page.
+                params.append(after)
+                after_filter = f"""AND (created_at, openai_message_id) {comparison} (
+                        SELECT created_at, openai_message_id FROM public.messages
+                        WHERE openai_message_id = $3 AND thread_id = t.id
+                    )"""
+        params.append(limit + 1)
+
+        async with pool.acquire() as conn:
+            # One round trip: the thread row (checking ownership) plus its page of
+            # messages. No row at all means the thread does not exist; a row with NULL
+            # message columns means the page is empty.
+            rows = await conn.fetch(
+                f"""
+                SELECT m.item, m.created_at, m.openai_message_id
+                FROM public.threads t
+                LEFT JOIN LATERAL (
                     SELECT item, created_at, openai_message_id
                     FROM public.messages
-                    WHERE thread_id = $1
-                    ORDER BY created_at {order_clause}
-                    LIMIT $2
-                    """,
-                    db_thread_id,
-                    limit + 1,
-                )
-
-            has_more = len(rows) > limit
-            rows = rows[:limit]
-
-            # Convert JSONB to ThreadItem objects
-            items = []
-            for row in rows:
-                item_data = row["item"] if isinstance(row["item"], dict) else json.loads(row["item"])
-                
-                # Ensure consistency with database values
-                item_data["id"] = row["openai_message_id"]
-                item_data["thread_id"] = thread_id
-                
-                # Convert to Pydantic object
-                thread_item = _thread_item_adapter.validate_python(item_data)
-                items.append(thread_item)
-
-            next_after = items[-1].id if has_more and items else None
-            return Page(data=items, has_more=has_more, after=next_after)
+                    WHERE thread_id = t.id {after_filter}
+                    ORDER BY created_at {order_clause}, openai_message_id {order_clause}
+                    LIMIT ${len(params)}
+                ) m ON true
+                WHERE t.openai_conversation_id = $1 AND t.user_id = $2
+                ORDER BY m.created_at {order_clause}, m.openai_message_id {order_clause}
+                """,
+                *params,
+            )
+            if not rows:
+                raise NotFoundError(f"Thread {thread_id} not found")
+            if rows[0]["openai_message_id"] is None:
+                rows = []
+
+        # The extra (limit + 1)th row only signals has_more. Items are built straight from
+        # the fetched records without slicing a copy of the list; each record's JSONB dict
+        # is handed to validation as is.
+        has_more = len(rows) > limit
+        from_row = _thread_item_from_row
+        items = [from_row(thread_id, row) for row in islice(rows, limit)]
+
+        next_after = None
+        if has_more and items:
+            last_row = rows[limit - 1]
+            next_after = _encode_cursor(last_row["created_at"], last_row["openai_message_id"])
+        return Page(data=items, has_more=has_more, after=next_after)
 
     async def add_thread_item(
         self, thread_id: str, item: ThreadItem, context: dict[str, Any]
@@ -302,117 +313,119 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
         pool = await get_db_pool()
         user_id = self._get_user_id(context)
 
+        # Serialized straight to JSON bytes by pydantic-core; the jsonb codec passes
+        # them through without building an intermediate dict
+        item_json = item.__pydantic_serializer__.to_json(item)
+
         async with pool.acquire() as conn:
-            thread_row = await conn.fetchrow(
-                "SELECT id FROM public.threads WHERE openai_conversation_id = $1 AND user_id = $2",
+            # Insert against the thread lookup; nothing is inserted if it is not found.
+            # $5 is cast to timestamp: next to a bare now() Postgres would infer
+            # timestamptz, and asyncpg would shift ChatKit's naive created_at by the
+            # process time zone instead of storing it verbatim.
+            message_id = await conn.fetchval(
+                """
+                INSERT INTO public.messages
+                (thread_id, openai_message_id, item, created_at, updated_at)
+                SELECT t.id, $3, $4, COALESCE($5::timestamp, now()::timestamp), now()
+                FROM public.threads t
+                WHERE t.openai_conversation_id = $1 AND t.user_id = $2
+                RETURNING id
+                """,
                 thread_id,
                 user_id,
+                item.id,
+                item_json,
+                item.created_at,
             )
-            if not thread_row:
+            if message_id is None:
                 raise NotFoundError(f"Thread {thread_id} not found")
 
-            db_thread_id = thread_row["id"]
+    async def add_thread_items_bulk(
+        self, thread_id: str, items: list[ThreadItem], context: dict[str, Any]
+    ) -> None:
+        """Insert several new items into a thread with a single statement.
+
+        The thread is resolved once and all rows go in through one
+        ``INSERT ... SELECT FROM unnest(...)`` over parallel arrays of IDs, items and
+        creation times, one round trip for the whole batch. There is no ON CONFLICT, so
+        the items must not already exist in the thread.
+        """
+        if not items:
+            return
 
-            # Convert ThreadItem to dict and serialize
-            item_dict = item.model_dump() if hasattr(item, "model_dump") else dict(item)
-            item_json = _serialize_for_json(item_dict)
+        pool = await get_db_pool()
+        user_id = self._get_user_id(context)
 
+        async with pool.acquire() as conn:
+            db_thread_id = await resolve_thread_id(conn, thread_id, user_id)
+            if db_thread_id is None:
+                raise NotFoundError(f"Thread {thread_id} not found")
+
+            # created_at is bound as timestamp and defaulted exactly as in add_thread_item
             await conn.execute(
                 """
                 INSERT INTO public.messages
                 (thread_id, openai_message_id, item, created_at, updated_at)
-                VALUES ($1, $2, $3, $4, $5)
+                SELECT $1, m.id, m.item, COALESCE(m.created_at, now()::timestamp), now()
+                FROM unnest($2::text[], $3::jsonb[], $4::timestamp[]) AS m(id, item, created_at)
                 """,
                 db_thread_id,
-                item.id,
-                json.dumps(item_json),
-                item_dict.get("created_at", datetime.now()),
-                datetime.now(),
+                [item.id for item in items],
+                [item.__pydantic_serializer__.to_json(item) for item in items],
+                [item.created_at for item in items],
             )
 
     async def save_item(self, thread_id: str, item: ThreadItem, context: dict[str, Any]) -> None:
         pool = await get_db_pool()
         user_id = self._get_user_id(context)
 
+        item_json = item.__pydantic_serializer__.to_json(item)
+
         async with pool.acquire() as conn:
-            thread_row = await conn.fetchrow(
-                "SELECT id FROM public.threads WHERE openai_conversation_id = $1 AND user_id = $2",
+            # Atomic upsert keyed by messages_thread_id_openai_message_id_key; the thread
+            # lookup doubles as the ownership check, so no row back means no such thread.
+            message_id = await conn.fetchval(
+                """
+                INSERT INTO public.messages
+                (thread_id, openai_message_id, item, created_at, updated_at)
+                SELECT t.id, $3, $4, COALESCE($5::timestamp, now()::timestamp), now()
+                FROM public.threads t
+                WHERE t.openai_conversation_id = $1 AND t.user_id = $2
+                ON CONFLICT (thread_id, openai_message_id) DO UPDATE
+                SET item = EXCLUDED.item, updated_at = now()
+                RETURNING id
+                """,
                 thread_id,
                 user_id,
-            )
-            if not thread_row:
-                raise NotFoundError(f"Thread {thread_id} not found")
-
-            db_thread_id = thread_row["id"]
-
-            existing = await conn.fetchrow(
-                "SELECT id FROM public.messages WHERE openai_message_id = $1 AND thread_id = $2",
                 item.id,
-                db_thread_id,
+                item_json,
+                item.created_at,
             )
-
-            item_dict = item.model_dump() if hasattr(item, "model_dump") else dict(item)
-            item_json = _serialize_for_json(item_dict)
-
-            if existing:
-                await conn.execute(
-                    """
-                    UPDATE public.messages
-                    SET item = $1, updated_at = $2
-                    WHERE id = $3
-                    """,
-                    json.dumps(item_json),
-                    datetime.now(),
-                    existing["id"],
-                )
-            else:
-                await conn.execute(
-                    """
-                    INSERT INTO public.messages
-                    (thread_id, openai_message_id, item, created_at, updated_at)
-                    VALUES ($1, $2, $3, $4, $5)
-                    """,
-                    db_thread_id,
-                    item.id,
-                    json.dumps(item_json),
-                    item_dict.get("created_at", datetime.now()),
-                    datetime.now(),
-                )
+            if message_id is None:
+                raise NotFoundError(f"Thread {thread_id} not found")
 
     async def load_item(self, thread_id: str, item_id: str, context: dict[str, Any]) -> ThreadItem:
         pool = await get_db_pool()
         user_id = self._get_user_id(context)
 
         async with pool.acquire() as conn:
-            thread_row = await conn.fetchrow(
-                "SELECT id FROM public.threads WHERE openai_conversation_id = $1 AND user_id = $2",
-                thread_id,
-                user_id,
-            )
-            if not thread_row:
-                raise NotFoundError(f"Thread {thread_id} not found")
-
-            db_thread_id = thread_row["id"]
-
             row = await conn.fetchrow(
                 """
-                SELECT item, openai_message_id
-                FROM public.messages
-                WHERE openai_message_id = $1 AND thread_id = $2
+                SELECT m.item, m.openai_message_id
+                FROM public.messages m
+                JOIN public.threads t ON t.id = m.thread_id
+                WHERE m.openai_message_id = $1
+                AND t.openai_conversation_id = $2 AND t.user_id = $3
                 """,
                 item_id,
-                db_thread_id,
+                thread_id,
+                user_id,
             )
 
             if not row:
                 raise NotFoundError(f"Item {item_id} not found")
 
-            item_data = row["item"] if isinstance(row["item"], dict) else json.loads(row["item"])
-            item_data["id"] = row["openai_message_id"]
-            item_data["thread_id"] = thread_id
-
-            thread_item = _thread_item_adapter.validate_python(item_data)
-            return thread_item
+            return _thread_item_from_row(thread_id, row)
 
     async def delete_thread_item(
         self, thread_id: str, item_id: str, context: dict[str, Any]
@@ -421,23 +434,18 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
         user_id = self._get_user_id(context)
 
         async with pool.acquire() as conn:
-            thread_row = await conn.fetchrow(
-                "SELECT id FROM public.threads WHERE openai_conversation_id = $1 AND user_id = $2",
-                thread_id,
-                user_id,
-            )
-            if not thread_row:
-                return
-
-            db_thread_id = thread_row["id"]
-
             await conn.execute(
                 """
                 DELETE FROM public.messages
-                WHERE openai_message_id = $1 AND thread_id = $2
+                WHERE openai_message_id = $1
+                AND thread_id = (
+                    SELECT id FROM public.threads
+                    WHERE openai_conversation_id = $2 AND user_id = $3
+                )
                 """,
                 item_id,
-                db_thread_id,
+                thread_id,
+                user_id,
             )
 
     # -- Files -----------------------------------------------------------
@@ -454,8 +462,6 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
         context: dict[str, Any],
     ) -> Attachment:
         """Load attachment metadata from database."""
-        from chatkit.types import FileAttachment, ImageAttachment
-
         user_id = self._get_user_id(context)
         pool = await get_db_pool()
 
@@ -505,4 +511,4 @@ class PostgresStoreSimplified(Store[dict[str, Any]]):
                 attachment_id,
                 user_id,
             )
-
+        forget_openai_file_id(attachment_id, user_id)
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
+
 from supabase import Client, create_client
 
 from .config import settings
@@ -15,6 +17,17 @@ def create_supabase_auth_client() -> Client:
     return create_client(settings.supabase_url, settings.supabase_anon_key)
 
 
+@lru_cache(maxsize=1)
+def get_supabase_auth_client() -> Client:
+    """Return the process-wide Supabase auth client.
+
+    Token validation only passes the JWT explicitly and never stores a session on the
+    client, so one instance can be shared across requests and keep its HTTP
+    connections to GoTrue alive.
+    """
+    return create_supabase_auth_client()
+
+
 def create_supabase_service_client() -> Client | None:
     """Create a Supabase client with service role privileges.
 
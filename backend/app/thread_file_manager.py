@@ -1,16 +1,69 @@
-"""Manage file associations with threads."""
+"""Manage file associations with threads.
+
+Indexes used here (see ``backend/migrations``): ``thread_files_unique`` UNIQUE
+(thread_id, openai_file_id) for attaching (011) and ``thread_files_thread_created``
+(thread_id, created_at DESC) for listing (012).
+"""
 
 from __future__ import annotations
 
 import logging
-from datetime import datetime
 from typing import Any
 from uuid import uuid4
 
-from .database import get_db_pool
+from .database import ConnectionLease, acquire_connection, resolve_thread_id
 
 logger = logging.getLogger(__name__)
 
+# The thread lookup doubles as the ownership check, so each listing is one round trip.
+_SELECT_THREAD_FILES = """
+    SELECT
+        tf.id,
+        tf.openai_file_id,
+        tf.created_at,
+        u.filename,
+        u.byte_size,
+        u.mime,
+        u.status
+    FROM public.thread_files tf
+    JOIN public.threads t ON t.id = tf.thread_id
+    LEFT JOIN public.uploads u ON u.openai_file_id = tf.openai_file_id
+    WHERE t.openai_conversation_id = $1 AND t.user_id = $2
+    ORDER BY tf.created_at DESC
+"""
+
+# Thread ownership check, existence check and insert in one statement: no row back means
+# the thread was not found, otherwise ``inserted`` tells a new association from an
+# existing one (the INSERT's own rows are not visible to the second branch).
+_ATTACH_FILE = """
+    WITH t AS (
+        SELECT id FROM public.threads
+        WHERE openai_conversation_id = $1 AND user_id = $2
+    ),
+    ins AS (
+        INSERT INTO public.thread_files (id, thread_id, openai_file_id, created_at, updated_at)
+        SELECT $3, t.id, $4, now(), now() FROM t
+        ON CONFLICT (thread_id, openai_file_id) DO NOTHING
+        RETURNING id, created_at
+    )
+    SELECT id, created_at, true AS inserted FROM ins
+    UNION ALL
+    SELECT tf.id, tf.created_at, false
+    FROM public.thread_files tf
+    JOIN t ON tf.thread_id = t.id
+    WHERE tf.openai_file_id = $4 AND NOT EXISTS (SELECT 1 FROM ins)
+    LIMIT 1
+"""
+
+_SELECT_THREAD_FILE_IDS = """
+    SELECT tf.openai_file_id
+    FROM public.thread_files tf
+    JOIN public.threads t ON t.id = tf.thread_id
+    WHERE t.openai_conversation_id = $1 AND t.user_id = $2
+    AND tf.openai_file_id IS NOT NULL
+    ORDER BY tf.created_at DESC
+"""
+
 
 class ThreadFileManager:
     """Manage associations between threads and OpenAI files."""
@@ -20,6 +73,7 @@ class ThreadFileManager:
         thread_id: str,
         openai_file_id: str,
         user_id: int,
+        lease: ConnectionLease | None = None,
     ) -> dict[str, Any]:
         """
         Attach a file to a thread.
@@ -28,120 +82,156 @@ class ThreadFileManager:
             thread_id: The ChatKit thread ID (openai_conversation_id)
             openai_file_id: The OpenAI file ID
             user_id: The user ID for authorization
+            lease: The request's connection lease, if any
 
         Returns:
             The created thread_file record
         """
-        pool = await get_db_pool()
-
-        async with pool.acquire() as conn:
-            # First, verify the thread belongs to the user
-            thread_row = await conn.fetchrow(
-                """
-                SELECT id FROM public.threads
-                WHERE openai_conversation_id = $1 AND user_id = $2
-                """,
-                thread_id,
-                user_id,
-            )
-
-            if not thread_row:
-                raise ValueError(f"Thread {thread_id} not found or access denied")
-
-            db_thread_id = thread_row["id"]
-
-            # Check if association already exists
-            existing = await conn.fetchrow(
-                """
-                SELECT id FROM public.thread_files
-                WHERE thread_id = $1 AND openai_file_id = $2
-                """,
-                db_thread_id,
-                openai_file_id,
+        async with acquire_connection(lease) as conn:
+            row = await conn.fetchrow(
+                _ATTACH_FILE, thread_id, user_id, str(uuid4()), openai_file_id
             )
 
-            if existing:
-                logger.info(f"File {openai_file_id} already attached to thread {thread_id}")
-                return {
-                    "id": existing["id"],
-                    "thread_id": thread_id,
-                    "openai_file_id": openai_file_id,
-                    "already_exists": True,
-                }
-
-            # Create the association
-            now = datetime.now()
-            thread_file_id = str(uuid4())
-
-            await conn.execute(
-                """
-                INSERT INTO public.thread_files (id, thread_id, openai_file_id, created_at, updated_at)
-                VALUES ($1, $2, $3, $4, $5)
-                """,
-                thread_file_id,
-                db_thread_id,
-                openai_file_id,
-                now,
-                now,
-            )
-
-            logger.info(f"Attached file {openai_file_id} to thread {thread_id}")
+        if not row:
+            raise ValueError(f"Thread {thread_id} not found or access denied")
 
+        if not row["inserted"]:
+            logger.info(f"File {openai_file_id} already attached to thread {thread_id}")
             return {
-                "id": thread_file_id,
+                "id": row["id"],
                 "thread_id": thread_id,
                 "openai_file_id": openai_file_id,
-                "created_at": now,
+                "already_exists": True,
             }
 
+        logger.info(f"Attached file {openai_file_id} to thread {thread_id}")
+
+        return {
+            "id": row["id"],
+            "thread_id": thread_id,
+            "openai_file_id": openai_file_id,
+            "created_at": row["created_at"],
+        }
+
     @staticmethod
-    async def get_thread_files(thread_id: str, user_id: int) -> list[dict[str, Any]]:
+    async def attach_files_to_thread(
+        thread_id: str,
+        openai_file_ids: list[str],
+        user_id: int,
+        lease: ConnectionLease | None = None,
+    ) -> list[dict[str, Any]]:
         """
-        Get all files attached to a thread.
+        Attach several files to a thread in one batch.
+
+        Files already attached to the thread are skipped; the rest are inserted
+        with a single INSERT ... ON CONFLICT instead of one round-trip per file.
 
         Args:
             thread_id: The ChatKit thread ID (openai_conversation_id)
+            openai_file_ids: The OpenAI file IDs to attach
             user_id: The user ID for authorization
+            lease: The request's connection lease, if any
 
         Returns:
-            List of file records with metadata
+            One record per file, in the order given, flagged like ``attach_file_to_thread``
         """
-        pool = await get_db_pool()
-
-        async with pool.acquire() as conn:
-            # Get thread database ID
-            thread_row = await conn.fetchrow(
-                """
-                SELECT id FROM public.threads
-                WHERE openai_conversation_id = $1 AND user_id = $2
-                """,
-                thread_id,
-                user_id,
-            )
+        async with acquire_connection(lease) as conn:
+            # First, verify the thread belongs to the user
+            db_thread_id = await resolve_thread_id(conn, thread_id, user_id)
 
-            if not thread_row:
-                return []
+            if db_thread_id is None:
+                raise ValueError(f"Thread {thread_id} not found or access denied")
 
-            db_thread_id = thread_row["id"]
+            # Drop duplicates while keeping the caller's order
+            file_ids = list(dict.fromkeys(openai_file_ids))
 
-            # Get all files for this thread with upload metadata
+            # One statement inserts the batch and reports files that were already
+            # attached; ON CONFLICT (thread_files_unique, 011) makes concurrent attaches
+            # of the same file safe. Timestamps come from the server's now().
             rows = await conn.fetch(
                 """
-                SELECT 
-                    tf.id,
-                    tf.openai_file_id,
-                    tf.created_at,
-                    u.filename,
-                    u.byte_size,
-                    u.mime,
-                    u.status
+                WITH ins AS (
+                    INSERT INTO public.thread_files
+                    (id, thread_id, openai_file_id, created_at, updated_at)
+                    SELECT new.id, $1, new.openai_file_id, now(), now()
+                    FROM unnest($2::varchar[], $3::varchar[]) AS new(id, openai_file_id)
+                    ON CONFLICT (thread_id, openai_file_id) DO NOTHING
+                    RETURNING id, openai_file_id, created_at
+                )
+                SELECT id, openai_file_id, created_at, true AS inserted FROM ins
+                UNION ALL
+                SELECT tf.id, tf.openai_file_id, tf.created_at, false
                 FROM public.thread_files tf
-                LEFT JOIN public.uploads u ON u.openai_file_id = tf.openai_file_id
-                WHERE tf.thread_id = $1
-                ORDER BY tf.created_at DESC
+                WHERE tf.thread_id = $1 AND tf.openai_file_id = ANY($3::varchar[])
+                AND tf.openai_file_id NOT IN (SELECT openai_file_id FROM ins)
                 """,
                 db_thread_id,
+                [str(uuid4()) for _ in file_ids],
+                file_ids,
             )
+            by_file_id = {row["openai_file_id"]: row for row in rows}
+
+            missing = [file_id for file_id in file_ids if file_id not in by_file_id]
+            if missing:
+                # Attached by a concurrent request that committed after this statement's
+                # snapshot was taken: ON CONFLICT skipped them, the SELECT branch
+                # could not see them yet.
+                late_rows = await conn.fetch(
+                    """
+                    SELECT id, openai_file_id, created_at, false AS inserted
+                    FROM public.thread_files
+                    WHERE thread_id = $1 AND openai_file_id = ANY($2::varchar[])
+                    """,
+                    db_thread_id,
+                    missing,
+                )
+                by_file_id.update((row["openai_file_id"], row) for row in late_rows)
+
+        inserted_count = sum(1 for row in by_file_id.values() if row["inserted"])
+        if inserted_count:
+            logger.info(f"Attached {inserted_count} files to thread {thread_id}")
+
+        results: list[dict[str, Any]] = []
+        for file_id in file_ids:
+            row = by_file_id[file_id]
+            if row["inserted"]:
+                results.append(
+                    {
+                        "id": row["id"],
+                        "thread_id": thread_id,
+                        "openai_file_id": file_id,
+                        "created_at": row["created_at"],
+                    }
+                )
+            else:
+                results.append(
+                    {
+                        "id": row["id"],
+                        "thread_id": thread_id,
+                        "openai_file_id": file_id,
+                        "already_exists": True,
+                    }
+                )
+        return results
+
+    @staticmethod
+    async def get_thread_files(
+        thread_id: str, user_id: int, lease: ConnectionLease | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Get all files attached to a thread.
+
+        Args:
+            thread_id: The ChatKit thread ID (openai_conversation_id)
+            user_id: The user ID for authorization
+            lease: The request's connection lease, if any
+
+        Returns:
+            List of file records with metadata
+        """
+        async with acquire_connection(lease) as conn:
+            # Get all files for this thread with upload metadata
+            rows = await conn.fetch(_SELECT_THREAD_FILES, thread_id, user_id)
 
             return [
                 {
@@ -161,6 +251,7 @@ class ThreadFileManager:
         thread_id: str,
         openai_file_id: str,
         user_id: int,
+        lease: ConnectionLease | None = None,
     ) -> bool:
         """
         Remove a file association from a thread.
@@ -169,39 +260,30 @@ class ThreadFileManager:
             thread_id: The ChatKit thread ID
             openai_file_id: The OpenAI file ID
             user_id: The user ID for authorization
+            lease: The request's connection lease, if any
 
         Returns:
             True if deleted, False if not found
         """
-        pool = await get_db_pool()
-
-        async with pool.acquire() as conn:
+        async with acquire_connection(lease) as conn:
             # Get thread database ID
-            thread_row = await conn.fetchrow(
-                """
-                SELECT id FROM public.threads
-                WHERE openai_conversation_id = $1 AND user_id = $2
-                """,
-                thread_id,
-                user_id,
-            )
+            db_thread_id = await resolve_thread_id(conn, thread_id, user_id)
 
-            if not thread_row:
+            if db_thread_id is None:
                 return False
 
-            db_thread_id = thread_row["id"]
-
-            # Delete the association
-            result = await conn.execute(
+            # Delete the association; a returned id means a row existed
+            deleted_id = await conn.fetchval(
                 """
                 DELETE FROM public.thread_files
                 WHERE thread_id = $1 AND openai_file_id = $2
+                RETURNING id
                 """,
                 db_thread_id,
                 openai_file_id,
             )
 
-            deleted = result.split()[-1] == "1"
+            deleted = deleted_id is not None
 
             if deleted:
                 logger.info(f"Detached file {openai_file_id} from thread {thread_id}")
@@ -209,7 +291,9 @@ class ThreadFileManager:
             return deleted
 
     @staticmethod
-    async def get_file_ids_for_thread(thread_id: str, user_id: int) -> list[str]:
+    async def get_file_ids_for_thread(
+        thread_id: str, user_id: int, lease: ConnectionLease | None = None
+    ) -> list[str]:
         """
         Get just the OpenAI file IDs for a thread.
         Useful when creating OpenAI Assistant runs.
@@ -217,10 +301,11 @@ class ThreadFileManager:
         Args:
             thread_id: The ChatKit thread ID
             user_id: The user ID for authorization
+            lease: The request's connection lease, if any
 
         Returns:
             List of OpenAI file IDs
         """
-        files = await ThreadFileManager.get_thread_files(thread_id, user_id)
-        return [f["openai_file_id"] for f in files if f["openai_file_id"]]
-
+        async with acquire_connection(lease) as conn:
+            rows = await conn.fetch(_SELECT_THREAD_FILE_IDS, thread_id, user_id)
+        return [row["openai_file_id"] for row in rows]
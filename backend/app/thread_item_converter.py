@@ -1,47 +1,196 @@
-"""Custom ThreadItemConverter to handle attachments with OpenAI Files API."""
+"""Custom ThreadItemConverter to handle attachments with OpenAI Files API.
+
+The OpenAI file ID lookups are index-only scans of ``uploads_id_user_id_covering_idx``
+(id, user_id) INCLUDE (openai_file_id, ...) from ``backend/migrations`` (007).
+"""
 
 from __future__ import annotations
 
-import base64
+import asyncio
 import logging
+from collections.abc import Sequence
+from functools import lru_cache
 from typing import Any
 
+import pybase64
+from agents import TResponseInputItem
+from cachetools import TTLCache
 from chatkit.agents import ThreadItemConverter
-from chatkit.types import Attachment, FileAttachment, ImageAttachment
-from openai.types.responses import ResponseInputContentParam, ResponseInputFileParam, ResponseInputImageParam
+from chatkit.types import (
+    Attachment,
+    FileAttachment,
+    ImageAttachment,
+    ThreadItem,
+    UserMessageItem,
+)
+from openai import AsyncOpenAI
+from openai.types.responses import (
+    ResponseInputContentParam,
+    ResponseInputFileParam,
+    ResponseInputImageParam,
+    ResponseInputTextParam,
+)
 
-from .database import get_db_pool
+from .coalesce import coalesce, coalesce_many
+from .database import ConnectionLease, acquire_connection
 
 logger = logging.getLogger(__name__)
 
+# uploads.id is a VARCHAR holding a UUID string (see 005/008), so attachment IDs bind
+# as text with no conversion on either side; parsing them into uuid.UUID would only
+# add work here.
+_SELECT_OPENAI_FILE_ID = """
+    SELECT openai_file_id FROM public.uploads
+    WHERE id = $1 AND user_id = $2 AND openai_file_id IS NOT NULL
+"""
+
+_SELECT_OPENAI_FILE_IDS = """
+    SELECT id, openai_file_id FROM public.uploads
+    WHERE id = ANY($1::text[]) AND user_id = $2 AND openai_file_id IS NOT NULL
+"""
+
+
+# (user_id, attachment_id) -> OpenAI file ID, shared across requests. An upload's file
+# ID does not change once set, so only found IDs are cached (an attachment still
+# uploading may get one later). The attachment stores call forget_openai_file_id when
+# an upload is replaced or deleted, but that only clears this worker's cache; the short
+# TTL bounds how long other workers can keep serving the old ID.
+_file_id_cache: TTLCache[tuple[int, str], str] = TTLCache(maxsize=10_000, ttl=60)
+# Lookups in flight, so concurrent misses for one key share a query (single or batched)
+_pending_file_id_lookups: dict[tuple[int, str], asyncio.Future[str | None]] = {}
+
+
+def forget_openai_file_id(attachment_id: str, user_id: int) -> None:
+    """Drop an attachment's cached OpenAI file ID."""
+    _file_id_cache.pop((user_id, attachment_id), None)
+
+
+async def get_openai_file_id(
+    attachment_id: str, user_id: int, lease: ConnectionLease | None = None
+) -> str | None:
+    """Get the OpenAI file ID for an attachment."""
+    key = (user_id, attachment_id)
+    cached = _file_id_cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def fetch() -> str | None:
+        async with acquire_connection(lease) as conn:
+            # fetchval hands back the single column without building a Record
+            openai_file_id = await conn.fetchval(_SELECT_OPENAI_FILE_ID, attachment_id, user_id)
+        if openai_file_id is not None:
+            _file_id_cache[key] = openai_file_id
+        return openai_file_id
+
+    return await coalesce(_pending_file_id_lookups, key, fetch)
+
 
-async def read_attachment_bytes(attachment_id: str, user_id: int) -> bytes | None:
+async def get_openai_file_ids(
+    attachment_ids: list[str], user_id: int, lease: ConnectionLease | None = None
+) -> dict[str, str]:
+    """Get the OpenAI file IDs for several attachments in one query.
+
+    Cached IDs are served from memory and only the rest are queried, minus any another
+    request is already looking up, which are awaited instead. Attachments that are not
+    found (or not uploaded yet) are left out of the result.
     """
-    Read attachment bytes from storage.
+    found: dict[str, str] = {}
+    missing: list[tuple[int, str]] = []
+    for attachment_id in attachment_ids:
+        key = (user_id, attachment_id)
+        cached = _file_id_cache.get(key)
+        if cached is not None:
+            found[attachment_id] = cached
+        else:
+            missing.append(key)
+    if not missing:
+        return found
+
+    async def fetch(keys: list[tuple[int, str]]) -> dict[tuple[int, str], str]:
+        async with acquire_connection(lease) as conn:
+            rows = await conn.fetch(
+                _SELECT_OPENAI_FILE_IDS, [attachment_id for _, attachment_id in keys], user_id
+            )
+        # Built after the connection is back in the pool. Positional access indexes the
+        # Record directly instead of looking up names.
+        fetched = {(user_id, row[0]): row[1] for row in rows}
+        _file_id_cache.update(fetched)
+        return fetched
 
-    In this implementation, we don't store the actual file bytes locally.
-    Instead, we rely on the OpenAI Files API where files are already uploaded.
-    This function is here for compatibility with the base64 approach if needed.
+    fetched = await coalesce_many(_pending_file_id_lookups, missing, fetch)
+    for (_, attachment_id), openai_file_id in fetched.items():
+        found[attachment_id] = openai_file_id
+    return found
+
+
+async def read_attachment_bytes(
+    attachment_id: str,
+    user_id: int,
+    openai_client: AsyncOpenAI,
+    lease: ConnectionLease | None = None,
+) -> bytes | None:
     """
-    # Since we upload to OpenAI directly, we don't need to store bytes locally
-    # This would be used if you wanted to store files in S3 or local storage
-    logger.warning(f"read_attachment_bytes called for {attachment_id} - not implemented for OpenAI Files API approach")
-    return None
+    Read attachment bytes back from the OpenAI Files API.
 
+    We don't store file bytes locally: uploads go straight to OpenAI with
+    purpose="assistants", which allows downloading their content again.
+
+    Returns:
+        The file content, or None if the attachment has not been uploaded yet
+    """
+    openai_file_id = await get_openai_file_id(attachment_id, user_id, lease)
+    if openai_file_id is None:
+        return None
+    response = await openai_client.files.content(openai_file_id)
+    return response.content
+
+
+# Raw bytes encoded per step when building a data URL; a multiple of 3, so every block
+# but the last encodes without padding and the blocks concatenate into valid base64
+_BASE64_BLOCK_SIZE = 3 * 64 * 1024
+
+
+def encode_data_url(mime_type: str | None, content: bytes) -> str:
+    """Build a ``data:`` URL for ``content``, base64-encoding it block by block.
+
+    The encoded blocks are written into one buffer behind the URL prefix, so no full
+    size base64 copy exists besides the buffer and the returned string.
+    """
+    prefix = f"data:{mime_type};base64,".encode()
+    buf = bytearray(len(prefix) + 4 * ((len(content) + 2) // 3))
+    with memoryview(buf) as out, memoryview(content) as view:
+        out[: len(prefix)] = prefix
+        pos = len(prefix)
+        for start in range(0, len(view), _BASE64_BLOCK_SIZE):
+            block = pybase64.b64encode(view[start : start + _BASE64_BLOCK_SIZE])
+            out[pos : pos + len(block)] = block
+            pos += len(block)
+    return buf.decode("ascii")
+
+
+_PDF_MIME_TYPE = "application/pdf"
+_FILE_URL_PREFIX = "file://"
+
+
+# Image and PDF parts depend only on the OpenAI file ID, so one dict per file is built
+# and shared by every conversion that references it. Callers must not mutate them.
+# Content parts throughout this module are dict literals: the param TypedDicts are
+# plain dicts at runtime, and a literal skips the keyword-argument call. Keep them
+# plain dicts of str keys and values (not pydantic models) so they serialize on the
+# JSON encoders' fast paths when the request to OpenAI is built.
+@lru_cache(maxsize=1024)
+def _image_param(openai_file_id: str) -> ResponseInputImageParam:
+    # Plain concatenation: a two-part string needs no f-string formatting machinery
+    return {
+        "type": "input_image",
+        "detail": "auto",
+        "image_url": _FILE_URL_PREFIX + openai_file_id,
+    }
 
-async def get_openai_file_id(attachment_id: str, user_id: int) -> str | None:
-    """Get the OpenAI file ID for an attachment."""
-    pool = await get_db_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            """
-            SELECT openai_file_id FROM public.uploads
-            WHERE id = $1 AND user_id = $2 AND openai_file_id IS NOT NULL
-            """,
-            attachment_id,
-            user_id,
-        )
-        return row["openai_file_id"] if row else None
+
+@lru_cache(maxsize=1024)
+def _file_param(openai_file_id: str) -> ResponseInputFileParam:
+    return {"type": "input_file", "file_id": openai_file_id}
 
 
 class OpenAIFileThreadItemConverter(ThreadItemConverter):
@@ -55,48 +204,107 @@ class OpenAIFileThreadItemConverter(ThreadItemConverter):
     def __init__(self, user_id: int):
         super().__init__()
         self.user_id = user_id
+        # Attachment ID -> OpenAI file ID (None if not uploaded) for this converter's
+        # lifetime, so attachments seen again are not looked up twice
+        self._file_ids: dict[str, str | None] = {}
+        # Set while to_agent_input runs: every lookup in one conversion shares a connection
+        self._lease: ConnectionLease | None = None
+
+    async def to_agent_input(
+        self, thread_items: Sequence[ThreadItem] | ThreadItem
+    ) -> list[TResponseInputItem]:
+        """Convert thread items, holding at most one pool connection throughout.
+
+        The file IDs of every user message's attachments are fetched up front in one
+        query, so the per-message conversions that follow need no database round trips.
+        """
+        items = thread_items if isinstance(thread_items, Sequence) else [thread_items]
+        lease = ConnectionLease()
+        self._lease = lease
+        try:
+            await self._prefetch_file_ids(
+                [
+                    attachment
+                    for item in items
+                    if isinstance(item, UserMessageItem)
+                    for attachment in item.attachments
+                ]
+            )
+            return await super().to_agent_input(thread_items)
+        finally:
+            self._lease = None
+            await lease.release()
+
+    async def user_message_to_input(
+        self, item: UserMessageItem, is_last_message: bool = True
+    ) -> TResponseInputItem | list[TResponseInputItem] | None:
+        """Prefetch the message's OpenAI file IDs in one query, then convert it."""
+        await self._prefetch_file_ids(item.attachments)
+        return await super().user_message_to_input(item, is_last_message)
 
-    async def attachment_to_message_content(
-        self, input: Attachment
-    ) -> ResponseInputContentParam:
+    async def _prefetch_file_ids(self, attachments: Sequence[Attachment]) -> None:
+        """Look up the OpenAI file IDs of any attachments not seen yet, in one query."""
+        missing = list(dict.fromkeys(a.id for a in attachments if a.id not in self._file_ids))
+        if not missing:
+            return
+        found = await get_openai_file_ids(missing, self.user_id, self._lease)
+        for attachment_id in missing:
+            self._file_ids[attachment_id] = found.get(attachment_id)
+
+    async def batch_build_params(
+        self, attachments: Sequence[Attachment]
+    ) -> list[ResponseInputContentParam]:
+        """
+        Build the content parts for several attachments with one database round trip.
+
+        File IDs not seen yet are fetched in a single query; the parts are then built
+        in order from each attachment and its file ID.
+
+        Raises:
+            ValueError: If an attachment has not been uploaded to OpenAI yet
+        """
+        await self._prefetch_file_ids(attachments)
+        return [self._content_part(a, self._file_ids[a.id]) for a in attachments]
+
+    async def attachment_to_message_content(self, input: Attachment) -> ResponseInputContentParam:
+        """Convert attachment to Agent SDK input using OpenAI file ID."""
+        # A hit on the message's prefetched file IDs needs no query
+        return (await self.batch_build_params([input]))[0]
+
+    @staticmethod
+    def _content_part(input: Attachment, openai_file_id: str | None) -> ResponseInputContentParam:
         """
-        Convert attachment to Agent SDK input using OpenAI file ID.
+        Build the content part for an attachment from its OpenAI file ID.
 
         For images, we use the file:// URL format with the OpenAI file ID.
         For PDFs, we use the file ID directly.
         For text files, we download and include as text since OpenAI only supports PDFs for context stuffing.
         """
-        # Get the OpenAI file ID from our database
-        openai_file_id = await get_openai_file_id(input.id, self.user_id)
-
         if not openai_file_id:
-            logger.error(f"No OpenAI file ID found for attachment {input.id}")
+            logger.error("No OpenAI file ID found for attachment %s", input.id)
             raise ValueError(f"File {input.name} has not been uploaded yet")
 
         if isinstance(input, ImageAttachment):
             # For images, use the file:// URL format
-            return ResponseInputImageParam(
-                type="input_image",
-                detail="auto",
-                image_url=f"file://{openai_file_id}",
-            )
+            return _image_param(openai_file_id)
 
         # For PDFs, use file_id with Code Interpreter
         # The Code Interpreter tool needs to be enabled in the Agent
-        if input.mime_type == "application/pdf":
-            logger.info(f"PDF file {input.name} will be processed with Code Interpreter, file_id: {openai_file_id}")
-            return ResponseInputFileParam(
-                type="input_file",
-                file_id=openai_file_id,
+        if input.mime_type == _PDF_MIME_TYPE:
+            logger.info(
+                "PDF file %s will be processed with Code Interpreter, file_id: %s",
+                input.name,
+                openai_file_id,
             )
+            return _file_param(openai_file_id)
 
         # For other file types, inform the assistant
-        logger.info(f"File {input.name} ({input.mime_type}) uploaded with ID {openai_file_id}")
-        from openai.types.responses import ResponseInputTextParam
-        return ResponseInputTextParam(
-            type="input_text",
-            text=f"[User has attached a file: {input.name} ({input.mime_type}). OpenAI File ID: {openai_file_id}]",
-        )
+        logger.info("File %s (%s) uploaded with ID %s", input.name, input.mime_type, openai_file_id)
+        text_part: ResponseInputTextParam = {
+            "type": "input_text",
+            "text": f"[User has attached a file: {input.name} ({input.mime_type}). OpenAI File ID: {openai_file_id}]",
+        }
+        return text_part
 
 
 class Base64ThreadItemConverter(ThreadItemConverter):
@@ -104,42 +312,38 @@ class Base64ThreadItemConverter(ThreadItemConverter):
     Alternative converter that uses base64-encoded payloads.
 
     This approach embeds the file content directly in the request,
-    which can be useful for small files or when you want to avoid
-    storing files in OpenAI.
+    which can be useful for small files or for models that should not
+    reference uploaded files by ID. The bytes are read back from the
+    OpenAI Files API.
     """
 
-    def __init__(self, user_id: int):
+    def __init__(self, user_id: int, openai_client: AsyncOpenAI):
         super().__init__()
         self.user_id = user_id
+        self.openai_client = openai_client
 
-    async def attachment_to_message_content(
-        self, input: Attachment
-    ) -> ResponseInputContentParam:
+    async def attachment_to_message_content(self, input: Attachment) -> ResponseInputContentParam:
         """Convert attachment to base64-encoded content."""
-        # This would require storing file bytes locally
-        content = await read_attachment_bytes(input.id, self.user_id)
+        content = await read_attachment_bytes(input.id, self.user_id, self.openai_client)
 
         if content is None:
             raise ValueError(f"Could not read file content for {input.id}")
 
-        data = (
-            "data:"
-            + str(input.mime_type)
-            + ";base64,"
-            + base64.b64encode(content).decode("utf-8")
-        )
+        # pybase64 uses a SIMD codec where the CPU has one
+        data = encode_data_url(input.mime_type, content)
 
         if isinstance(input, ImageAttachment):
-            return ResponseInputImageParam(
-                type="input_image",
-                detail="auto",
-                image_url=data,
-            )
+            image_part: ResponseInputImageParam = {
+                "type": "input_image",
+                "detail": "auto",
+                "image_url": data,
+            }
+            return image_part
 
         # Note: Agents SDK currently only supports pdf files as ResponseInputFileParam
-        return ResponseInputFileParam(
-            type="input_file",
-            file_data=data,
-            filename=input.name or "unknown",
-        )
-
+        file_part: ResponseInputFileParam = {
+            "type": "input_file",
+            "file_data": data,
+            "filename": input.name or "unknown",
+        }
+        return file_part
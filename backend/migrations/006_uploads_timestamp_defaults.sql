@@ -0,0 +1,38 @@
+-- Migration: Let Postgres manage upload timestamps
+-- created_at/updated_at are filled by the database instead of being sent as query parameters
+
+-- Step 1: Default both timestamps to the transaction time
+ALTER TABLE public.uploads
+ALTER COLUMN created_at SET DEFAULT now();
+
+ALTER TABLE public.uploads
+ALTER COLUMN updated_at SET DEFAULT now();
+
+-- Step 2: Keep updated_at current on every UPDATE (including ON CONFLICT DO UPDATE)
+CREATE OR REPLACE FUNCTION public.set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS uploads_set_updated_at ON public.uploads;
+
+CREATE TRIGGER uploads_set_updated_at
+BEFORE UPDATE ON public.uploads
+FOR EACH ROW
+EXECUTE FUNCTION public.set_updated_at();
+
+-- Step 3: Verify the change
+SELECT
+    column_name,
+    column_default
+FROM information_schema.columns
+WHERE table_name = 'uploads'
+AND table_schema = 'public'
+AND column_name IN ('created_at', 'updated_at');
+
+-- You should see:
+-- created_at: now()
+-- updated_at: now()
@@ -0,0 +1,18 @@
+-- Migration: Covering indexes for the hot auth and attachment lookups
+-- Lets Postgres answer these queries with index-only scans instead of heap fetches.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run this file
+-- with psql directly (not wrapped in BEGIN/COMMIT).
+
+-- Step 1: auth_user_id -> public user ID (get_user_id_from_auth_id, every request)
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_auth_user_id_id_idx
+ON public.users (auth_user_id) INCLUDE (id);
+
+-- Step 2: attachment metadata by owner (SupabaseAttachmentStore.get_attachment)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS uploads_id_user_id_covering_idx
+ON public.uploads (id, user_id) INCLUDE (openai_file_id, filename, byte_size, mime, created_at);
+
+-- Verify migration
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE schemaname = 'public'
+AND indexname IN ('users_auth_user_id_id_idx', 'uploads_id_user_id_covering_idx');
@@ -0,0 +1,21 @@
+-- Migration: Generate upload IDs in the database
+-- Rows inserted without an id (direct uploads) get a random UUID instead of relying on
+-- application code. Two-phase attachment IDs are full UUIDs generated by the backend,
+-- so both paths share the same ID format.
+
+-- Step 1: gen_random_uuid() is built in from Postgres 13; pgcrypto provides it before that
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- Step 2: Default the primary key to a random UUID
+ALTER TABLE public.uploads
+ALTER COLUMN id SET DEFAULT gen_random_uuid()::text;
+
+-- Verify the change
+SELECT column_name, column_default
+FROM information_schema.columns
+WHERE table_name = 'uploads'
+AND table_schema = 'public'
+AND column_name = 'id';
+
+-- You should see:
+-- id: (gen_random_uuid())::text
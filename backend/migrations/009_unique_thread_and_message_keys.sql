@@ -0,0 +1,21 @@
+-- Migration: Unique keys for thread and message upserts
+-- save_thread and save_item use INSERT ... ON CONFLICT, which needs these constraints.
+-- Adding them fails if duplicates already exist; remove those first.
+
+-- Step 1: One row per ChatKit thread ID per user
+ALTER TABLE public.threads
+ADD CONSTRAINT threads_user_id_openai_conversation_id_key
+UNIQUE (user_id, openai_conversation_id);
+
+-- Step 2: One row per ChatKit item ID per thread
+ALTER TABLE public.messages
+ADD CONSTRAINT messages_thread_id_openai_message_id_key
+UNIQUE (thread_id, openai_message_id);
+
+-- Verify migration
+SELECT conname, conrelid::regclass
+FROM pg_constraint
+WHERE conname IN (
+    'threads_user_id_openai_conversation_id_key',
+    'messages_thread_id_openai_message_id_key'
+);
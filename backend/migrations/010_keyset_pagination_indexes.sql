@@ -0,0 +1,19 @@
+-- Migration: Indexes for keyset pagination of threads and messages
+-- load_threads and load_thread_items page on (created_at, ChatKit ID); these indexes
+-- serve both orders (descending directly, ascending via a backward scan).
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run this file
+-- with psql directly (not wrapped in BEGIN/COMMIT).
+
+-- Step 1: A user's threads
+CREATE INDEX CONCURRENTLY IF NOT EXISTS threads_user_created_id
+ON public.threads (user_id, created_at DESC, openai_conversation_id DESC);
+
+-- Step 2: A thread's messages
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_thread_created_id
+ON public.messages (thread_id, created_at DESC, openai_message_id DESC);
+
+-- Verify migration
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE schemaname = 'public'
+AND indexname IN ('threads_user_created_id', 'messages_thread_created_id');
@@ -0,0 +1,12 @@
+-- Migration: One association per file per thread
+-- attach_file_to_thread inserts with ON CONFLICT (thread_id, openai_file_id) DO NOTHING,
+-- which needs this unique index. Remove duplicate associations first if any exist.
+
+CREATE UNIQUE INDEX IF NOT EXISTS thread_files_unique
+ON public.thread_files (thread_id, openai_file_id);
+
+-- Verify migration
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE schemaname = 'public'
+AND indexname = 'thread_files_unique';
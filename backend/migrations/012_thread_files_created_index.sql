@@ -0,0 +1,13 @@
+-- Migration: Index for listing a thread's files newest first
+-- ThreadFileManager.get_thread_files filters by thread_id and orders by created_at DESC.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run this file
+-- with psql directly (not wrapped in BEGIN/COMMIT).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS thread_files_thread_created
+ON public.thread_files (thread_id, created_at DESC);
+
+-- Verify migration
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE schemaname = 'public'
+AND indexname = 'thread_files_thread_created';
@@ -0,0 +1,25 @@
+-- Migration: Cascade thread deletes to messages and thread files
+-- delete_thread removes only the thread row; the foreign keys clean up its messages and
+-- file associations in the same statement.
+-- The constraint names below are Postgres' defaults; adjust them if yours differ
+-- (see the verify query).
+
+-- Step 1: Messages follow their thread
+ALTER TABLE public.messages
+DROP CONSTRAINT IF EXISTS messages_thread_id_fkey,
+ADD CONSTRAINT messages_thread_id_fkey
+FOREIGN KEY (thread_id) REFERENCES public.threads(id) ON DELETE CASCADE;
+
+-- Step 2: File associations follow their thread
+ALTER TABLE public.thread_files
+DROP CONSTRAINT IF EXISTS thread_files_thread_id_fkey,
+ADD CONSTRAINT thread_files_thread_id_fkey
+FOREIGN KEY (thread_id) REFERENCES public.threads(id) ON DELETE CASCADE;
+
+-- Verify migration
+SELECT conname, conrelid::regclass, confdeltype
+FROM pg_constraint
+WHERE contype = 'f'
+AND confrelid = 'public.threads'::regclass;
+
+-- You should see confdeltype = 'c' (cascade) for both constraints
@@ -0,0 +1,109 @@
+"""Tests for sharing in-flight lookups between concurrent callers."""
+
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from app.coalesce import coalesce, coalesce_many
+
+
+class CoalesceTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_one_fetch(self) -> None:
+        pending: dict[str, asyncio.Future[str]] = {}
+        calls = 0
+
+        async def fetch() -> str:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            return "user"
+
+        results = await asyncio.gather(*(coalesce(pending, "token", fetch) for _ in range(3)))
+
+        self.assertEqual(results, ["user"] * 3)
+        self.assertEqual(calls, 1)
+        self.assertEqual(pending, {})
+
+    async def test_cancelled_owner_does_not_fail_other_waiters(self) -> None:
+        pending: dict[str, asyncio.Future[str]] = {}
+        release = asyncio.Event()
+
+        async def fetch() -> str:
+            await release.wait()
+            return "user"
+
+        owner = asyncio.create_task(coalesce(pending, "token", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(coalesce(pending, "token", fetch))
+        await asyncio.sleep(0)
+
+        owner.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await owner
+        release.set()
+
+        self.assertEqual(await waiter, "user")
+        self.assertEqual(pending, {})
+
+    async def test_failure_reaches_every_waiter(self) -> None:
+        pending: dict[str, asyncio.Future[str]] = {}
+
+        async def fetch() -> str:
+            await asyncio.sleep(0)
+            raise ValueError("invalid token")
+
+        results = await asyncio.gather(
+            coalesce(pending, "token", fetch),
+            coalesce(pending, "token", fetch),
+            return_exceptions=True,
+        )
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(pending, {})
+
+
+class CoalesceManyTest(unittest.IsolatedAsyncioTestCase):
+    async def test_overlapping_batches_fetch_each_key_once(self) -> None:
+        pending: dict[str, asyncio.Future[str | None]] = {}
+        fetched: list[list[str]] = []
+
+        async def fetch(keys: list[str]) -> dict[str, str]:
+            fetched.append(keys)
+            await asyncio.sleep(0)
+            return {key: key.upper() for key in keys if key != "missing"}
+
+        first, second = await asyncio.gather(
+            coalesce_many(pending, ["a", "b", "missing"], fetch),
+            coalesce_many(pending, ["b", "c", "missing"], fetch),
+        )
+
+        self.assertEqual(first, {"a": "A", "b": "B"})
+        self.assertEqual(second, {"b": "B", "c": "C"})
+        self.assertEqual(fetched, [["a", "b", "missing"], ["c"]])
+        self.assertEqual(pending, {})
+
+    async def test_cancelled_owner_does_not_fail_other_waiters(self) -> None:
+        pending: dict[str, asyncio.Future[str | None]] = {}
+        release = asyncio.Event()
+
+        async def fetch(keys: list[str]) -> dict[str, str]:
+            await release.wait()
+            return {key: key.upper() for key in keys}
+
+        owner = asyncio.create_task(coalesce_many(pending, ["a", "b"], fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(coalesce_many(pending, ["b"], fetch))
+        await asyncio.sleep(0)
+
+        owner.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await owner
+        release.set()
+
+        self.assertEqual(await waiter, {"b": "B"})
+        self.assertEqual(pending, {})
+
+
+if __name__ == "__main__":
+    unittest.main()